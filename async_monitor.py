@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""asyncio 接口：以异步生成器的方式推送内存快照
+
+    async with AsyncMemoryMonitor(interval=2) as monitor:
+        async for snapshot in monitor.stream():
+            print(snapshot.system_percent)
+"""
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Set
+from memory_monitor import MemoryMonitor, ProcessMemoryInfo
+from paging import ProcessPaging
+from config import MONITOR_INTERVAL, ASYNC_QUEUE_SIZE
+
+_CLOSED = object()
+
+
+class _Failed:
+    """采集异常，由 stream() 在消费者中重新抛出"""
+    __slots__ = ('error',)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+@dataclass
+class MemorySnapshot:
+    timestamp: float  # time.time()
+    system_percent: float
+    processes: List[ProcessMemoryInfo]
+    paging: Dict[int, ProcessPaging] = field(default_factory=dict)  # pid -> 缺页/交换指标
+
+
+class _Subscriber:
+    __slots__ = ('queue', 'dropped')
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def push(self, item):
+        """队列满时丢弃最旧的快照，不阻塞采集"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+
+class AsyncMemoryMonitor:
+    """在线程池中执行阻塞的采集，所有订阅者共享同一次采集结果"""
+
+    def __init__(self, interval: float = MONITOR_INTERVAL / 1000, limit: int = 10,
+                 queue_size: int = ASYNC_QUEUE_SIZE, monitor: MemoryMonitor = None,
+                 executor: Optional[Executor] = None):
+        self.interval = interval
+        self.limit = limit
+        self.queue_size = queue_size
+        self.monitor = monitor or MemoryMonitor(interval=interval)
+        self.executor = executor
+        self.subscribers: Set[_Subscriber] = set()
+        self.latest: Optional[MemorySnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        # 线程中的采集无法取消；持有该锁期间执行采集或关闭工作池，新旧采集不会重叠
+        self._scan_lock = asyncio.Lock()
+
+    def _scan(self) -> MemorySnapshot:
+        percent = self.monitor.get_system_memory()
+        processes = self.monitor.get_top_processes(self.limit)
+        paging = self.monitor.collect_paging()
+        self.monitor.update_process_history(processes)
+        return MemorySnapshot(time.time(), percent, processes, paging)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            async with self._scan_lock:
+                future = loop.run_in_executor(self.executor, self._scan)
+                try:
+                    snapshot = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # 取消只能中断等待，等线程中的采集结束后再释放锁
+                    await asyncio.wait({future})
+                    raise
+                except Exception as e:
+                    # 采集失败时结束本轮采集，通知所有订阅者，避免消费者永久等待
+                    for sub in self.subscribers:
+                        sub.push(_Failed(e))
+                    return
+            self.latest = snapshot
+            for sub in self.subscribers:
+                sub.push(snapshot)
+            # 按固定时间点调度，避免采集耗时累积漂移；超时则跳过错过的周期
+            deadline += self.interval
+            now = loop.time()
+            if deadline < now:
+                deadline += (now - deadline) // self.interval * self.interval + self.interval
+            await asyncio.sleep(deadline - now)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止采集并结束所有订阅者的 stream()，等线程中进行中的采集结束后再返回"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for sub in self.subscribers:
+            sub.push(_CLOSED)
+        # 并行扫描的工作池在下次采集时会按需重建；stop 之后立即 start 的新采集会等关闭完成
+        async with self._scan_lock:
+            self.monitor.close()
+
+    async def stream(self, queue_size: int = None) -> AsyncIterator[MemorySnapshot]:
+        """订阅快照流；消费过慢时丢弃最旧的快照，采集出错时抛出该异常"""
+        sub = _Subscriber(queue_size or self.queue_size)
+        self.subscribers.add(sub)
+        self.start()
+        try:
+            while True:
+                item = await sub.queue.get()
+                if item is _CLOSED:
+                    return
+                if isinstance(item, _Failed):
+                    raise item.error
+                yield item
+        finally:
+            self.subscribers.discard(sub)
+
+    async def __aenter__(self) -> 'AsyncMemoryMonitor':
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""按星期几 × 小时(168 个时段)学习的内存基线，用于识别偏离季节性规律的异常
+
+每个对象(系统或进程名)在每个时段保存 [样本数, 均值, 离差平方和]，用 Welford 算法增量更新，
+内存占用与运行时长无关。基线以定长二进制块保存在 SQLite 文件中，按对象首次访问时才读取。
+"""
+import math
+import sqlite3
+import time
+from array import array
+from typing import Dict, Optional, Tuple
+from config import (BASELINE_FILE, BASELINE_MIN_SAMPLES, BASELINE_Z_THRESHOLD, BASELINE_MIN_STD_RATIO,
+                    BASELINE_FLUSH_TICKS, BASELINE_CACHE_LIMIT)
+
+BUCKETS = 7 * 24
+SYSTEM_KEY = ''  # 采集时空进程名记为 Unknown，空字符串不会与进程冲突
+_META_TRAINED = 'trained_until'
+_EMPTY = bytes(array('d', [0.0]) * (BUCKETS * 3))
+
+
+def bucket_of(t: float) -> int:
+    """本地时间所在的时段：星期几 * 24 + 小时"""
+    lt = time.localtime(t)
+    return lt.tm_wday * 24 + lt.tm_hour
+
+
+class BaselineModel:
+    def __init__(self, path: str = BASELINE_FILE, min_samples: int = BASELINE_MIN_SAMPLES,
+                 z_threshold: float = BASELINE_Z_THRESHOLD):
+        self.path = path
+        self.min_samples = min_samples
+        self.z_threshold = z_threshold
+        self.cache: Dict[str, array] = {}
+        self.dirty = set()
+        self.ticks = 0
+        self._db = None
+        self._trained_until: Optional[float] = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS baseline (key TEXT PRIMARY KEY, stats BLOB NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        return self._db
+
+    def _stats(self, key: str, create: bool = False) -> Optional[array]:
+        stats = self.cache.get(key)
+        if stats is not None:
+            return stats
+        row = self._open().execute('SELECT stats FROM baseline WHERE key = ?', (key,)).fetchone()
+        raw = row[0] if row is not None and len(row[0]) == len(_EMPTY) else None
+        if raw is None and not create:
+            return None
+        if len(self.cache) >= BASELINE_CACHE_LIMIT:
+            self.flush()
+            self.cache.clear()
+        stats = array('d')
+        stats.frombytes(raw if raw is not None else _EMPTY)
+        self.cache[key] = stats
+        return stats
+
+    @property
+    def trained_until(self) -> float:
+        """已学习数据的截止时间，避免从历史记录重复学习"""
+        if self._trained_until is None:
+            row = self._open().execute('SELECT value FROM meta WHERE key = ?', (_META_TRAINED,)).fetchone()
+            self._trained_until = float(row[0]) if row is not None else 0.0
+        return self._trained_until
+
+    def update(self, key: str, value: float, t: float):
+        stats = self._stats(key, create=True)
+        i = bucket_of(t) * 3
+        n = stats[i] + 1
+        delta = value - stats[i + 1]
+        stats[i] = n
+        stats[i + 1] += delta / n
+        stats[i + 2] += delta * (value - stats[i + 1])
+        self.dirty.add(key)
+
+    def expected(self, key: str, t: float) -> Optional[Tuple[float, float]]:
+        """时段内的 (均值, 标准差)；样本不足时返回 None"""
+        stats = self._stats(key)
+        if stats is None:
+            return None
+        i = bucket_of(t) * 3
+        n = stats[i]
+        if n < self.min_samples:
+            return None
+        return stats[i + 1], math.sqrt(stats[i + 2] / (n - 1))
+
+    def deviation(self, key: str, value: float, t: float = None) -> Optional[float]:
+        """相对时段均值的变化百分比；在 z_threshold 个标准差以内视为正常返回 0，基线不足时返回 None"""
+        if t is None:
+            t = time.time()
+        baseline = self.expected(key, t)
+        if baseline is None:
+            return None
+        mean, std = baseline
+        # 方差极小的时段设下限，避免微小波动被放大
+        std = max(std, abs(mean) * BASELINE_MIN_STD_RATIO, 1e-3)
+        if abs(value - mean) <= self.z_threshold * std or mean <= 0:
+            return 0.0
+        return (value - mean) / mean * 100
+
+    def observe(self, system_percent: float, totals: Dict[str, float], t: float = None):
+        """用一次采集更新系统和各进程名的基线；totals 为完整快照中各进程名的占比合计"""
+        if t is None:
+            t = time.time()
+        self.update(SYSTEM_KEY, system_percent, t)
+        for name, percent in totals.items():
+            self.update(name, percent, t)
+        self._trained_until = t
+        self.ticks += 1
+        if self.ticks % BASELINE_FLUSH_TICKS == 0:
+            self.flush()
+
+    def train(self, store, start: float = 0.0, end: float = None) -> int:
+        """从历史记录学习尚未学习过的时间段，返回使用的记录数"""
+        if end is None:
+            end = time.time()
+        count = 0
+        for record in store.records(max(start, self.trained_until), end):
+            t = record['t']
+            if t <= self.trained_until:
+                continue
+            self.update(SYSTEM_KEY, record['s'], t)
+            totals: Dict[str, float] = {}
+            for row in record['p']:
+                totals[row[1]] = totals.get(row[1], 0.0) + row[2]
+            for name, percent in totals.items():
+                self.update(name, percent, t)
+            self._trained_until = t
+            count += 1
+            if count % 10000 == 0:
+                self.flush()
+                self.cache.clear()
+        self.flush()
+        return count
+
+    def flush(self):
+        if not self.dirty and self._trained_until is None:
+            return
+        db = self._open()
+        db.executemany('INSERT OR REPLACE INTO baseline (key, stats) VALUES (?, ?)',
+                       [(key, self.cache[key].tobytes()) for key in self.dirty])
+        self.dirty.clear()
+        if self._trained_until is not None:
+            db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                       (_META_TRAINED, repr(self._trained_until)))
+        db.commit()
+
+    def close(self):
+        if self._db is None:
+            return
+        self.flush()
+        self._db.close()
+        self._db = None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""无界面基准测试：按采集周期运行若干次检查自身资源预算，或测试并行扫描的扩展性"""
+import argparse
+import sys
+import time
+import tracemalloc
+from memory_monitor import MemoryMonitor
+from profiler import Profiler
+from config import (MONITOR_INTERVAL, PROFILE_BUDGET_RSS_MB, PROFILE_BUDGET_CPU_PERCENT, PROFILE_BUDGET_ALLOC_BYTES,
+                    PAGING_BUDGET_MS)
+
+
+def run_ticks(ticks: int, interval_ms: int, output: str = None) -> Profiler:
+    monitor = MemoryMonitor(interval=interval_ms / 1000)
+    profiler = Profiler(enabled=True)
+    for _ in range(ticks):
+        start = time.monotonic()
+        with profiler.span('system'):
+            monitor.get_system_memory()
+        with profiler.span('scan'):
+            processes = monitor.get_top_processes(10)
+        with profiler.span('paging'):
+            monitor.collect_paging()
+        with profiler.span('history'):
+            monitor.update_process_history(processes)
+        with profiler.span('spike'):
+            monitor.detect_memory_spike(processes)
+        profiler.sample_self()
+        time.sleep(max(0.0, interval_ms / 1000 - (time.monotonic() - start)))
+    if output:
+        profiler.dump(output)
+    return profiler
+
+
+def scan_scaling(max_workers: int, repeat: int, use_processes: bool = False):
+    """用 1..max_workers 个工作线程分别扫描，打印平均耗时和加速比"""
+    monitor = MemoryMonitor(scan_workers=1, use_processes=use_processes)
+    baseline = None
+    print(f"{'workers':>7} {'ms':>9} {'speedup':>8}")
+    for workers in range(1, max_workers + 1):
+        monitor.get_top_processes(10, workers=workers)  # 预热：建立工作池和 Process 缓存
+        start = time.perf_counter()
+        for _ in range(repeat):
+            monitor.get_top_processes(10, workers=workers)
+        ms = (time.perf_counter() - start) / repeat * 1000
+        baseline = baseline or ms
+        print(f"{workers:>7} {ms:>9.2f} {baseline / ms:>7.2f}x")
+    monitor.close()
+
+
+def tick_allocations(ticks: int, warmup: int = 5) -> float:
+    """用 tracemalloc 统计预热后每次采集净增的内存(字节)"""
+    monitor = MemoryMonitor(scan_workers=1)
+    for _ in range(warmup):
+        monitor.update_process_history(monitor.get_top_processes(10))
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(ticks):
+        processes = monitor.get_top_processes(10)
+        monitor.update_process_history(processes)
+        monitor.detect_memory_spike(processes)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename')) / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ticks', type=int, default=30, help='采集次数')
+    parser.add_argument('--interval', type=int, default=MONITOR_INTERVAL, help='采集间隔(毫秒)')
+    parser.add_argument('--budget-rss', type=float, default=PROFILE_BUDGET_RSS_MB, help='内存预算(MB)')
+    parser.add_argument('--budget-cpu', type=float, default=PROFILE_BUDGET_CPU_PERCENT, help='CPU预算(%%)')
+    parser.add_argument('--budget-paging', type=float, default=PAGING_BUDGET_MS, help='缺页指标采集耗时预算(毫秒, p95)')
+    parser.add_argument('--budget-alloc', type=float, default=PROFILE_BUDGET_ALLOC_BYTES,
+                        help='每次采集净分配预算(字节)')
+    parser.add_argument('--output', help='剖析结果 JSON 输出路径')
+    parser.add_argument('--scan-scaling', type=int, metavar='N', help='测试 1..N 个工作线程的扫描耗时')
+    parser.add_argument('--repeat', type=int, default=10, help='扩展性测试每档重复次数')
+    parser.add_argument('--processes', action='store_true', help='扩展性测试使用进程池')
+    parser.add_argument('--alloc', action='store_true', help='统计每次采集的净内存分配')
+    args = parser.parse_args()
+
+    if args.alloc:
+        per_tick = tick_allocations(args.ticks)
+        print(f"每次采集净分配: {per_tick:.0f} 字节")
+        if per_tick > args.budget_alloc:
+            print(f"超出预算: 每次采集净分配 {per_tick:.0f} 字节 > {args.budget_alloc:.0f} 字节", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.scan_scaling:
+        scan_scaling(args.scan_scaling, args.repeat, args.processes)
+        return
+
+    profiler = run_ticks(args.ticks, args.interval, args.output)
+    print(profiler.overlay_text())
+    violations = profiler.check_budget(args.budget_rss, args.budget_cpu)
+    paging_ms = profiler.phases['paging'].percentile(95) / 1000
+    if paging_ms > args.budget_paging:
+        violations.append(f"缺页指标采集 p95 {paging_ms:.2f} ms > {args.budget_paging} ms")
+    for v in violations:
+        print(f"超出预算: {v}", file=sys.stderr)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
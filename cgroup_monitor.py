@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""cgroup v2 内存监控模块"""
+import ctypes
+import ctypes.util
+import os
+import struct
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import psutil
+from config import (HISTORY_LENGTH, SPIKE_CHECK_WINDOW, MEMORY_SPIKE_THRESHOLD,
+                    CGROUP_ROOT, CGROUP_RESCAN_TICKS)
+
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_IN_ONLYDIR = 0x01000000
+_EVENT_HEADER = struct.Struct('iIII')
+_STAT_FIELDS = ('anon', 'file', 'shmem', 'kernel', 'sock')
+
+
+@dataclass
+class CgroupMemoryInfo:
+    path: str  # 相对 cgroup 根目录的路径
+    name: str
+    memory_percent: float  # 占自身(或最近祖先)限额的百分比
+    memory_mb: float
+    limit_mb: float
+    anon_mb: float
+    file_mb: float
+
+
+def is_cgroup_v2(root: str = CGROUP_ROOT) -> bool:
+    return os.path.exists(os.path.join(root, 'cgroup.controllers'))
+
+
+def _read_int(path: str) -> Optional[int]:
+    """读取单值文件，'max' 返回 None"""
+    with open(path) as f:
+        value = f.read().strip()
+    return None if value == 'max' else int(value)
+
+
+def _read_limit(path: str) -> Optional[int]:
+    """读取 memory.max，根 cgroup 没有该文件时视为无限额"""
+    try:
+        return _read_int(os.path.join(path, 'memory.max'))
+    except FileNotFoundError:
+        return None
+
+
+def own_cgroup_path(root: str = CGROUP_ROOT, proc_self: str = '/proc/self/cgroup') -> Optional[str]:
+    """返回当前进程所在 cgroup v2 的目录，非 v2 环境返回 None"""
+    if not is_cgroup_v2(root):
+        return None
+    try:
+        with open(proc_self) as f:
+            for line in f:
+                if line.startswith('0::'):
+                    path = os.path.join(root, line[3:].strip().lstrip('/'))
+                    return path if os.path.isdir(path) else None
+    except OSError:
+        pass
+    return None
+
+
+def cgroup_usage(path: str) -> Optional[Tuple[int, int]]:
+    """返回 (当前用量, 有效限额) 字节；沿祖先查找最小限额，均无限额时返回 None"""
+    try:
+        current = _read_int(os.path.join(path, 'memory.current'))
+    except (OSError, ValueError):
+        return None
+    limit = None
+    while True:
+        if not os.path.exists(os.path.join(path, 'memory.current')):
+            break
+        try:
+            value = _read_limit(path)
+        except (OSError, ValueError):
+            break
+        if value is not None:
+            limit = value if limit is None else min(limit, value)
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    if limit is None or current is None:
+        return None
+    return current, limit
+
+
+class _Inotify:
+    """基于 ctypes 的最小 inotify 封装，仅监听子目录的创建和删除"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        self.watches: Dict[int, str] = {}
+
+    def watch(self, path: str):
+        wd = self._add_watch(self.fd, os.fsencode(path), _IN_CREATE | _IN_DELETE | _IN_ONLYDIR)
+        if wd >= 0:
+            self.watches[wd] = path
+
+    def read_events(self) -> List[Tuple[str, int, str]]:
+        """非阻塞读取事件，返回 (父目录, mask, 名称)"""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+                offset += length
+                if mask & _IN_IGNORED:
+                    self.watches.pop(wd, None)
+                else:
+                    events.append((self.watches.get(wd, ''), mask, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class CgroupMonitor:
+    """增量维护 cgroup 目录树，逐个读取内存用量"""
+
+    def __init__(self, root: str = CGROUP_ROOT, use_inotify: bool = True):
+        self.root = root
+        self.paths: List[str] = []  # 按深度排序，父节点在前
+        self.history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=HISTORY_LENGTH))
+        self.ticks = 0
+        self.latest: List[CgroupMemoryInfo] = []  # 最近一次 get_top_cgroups 采集的全部 cgroup，按占比降序
+        self.total_bytes = psutil.virtual_memory().total
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = _Inotify()
+            except (OSError, AttributeError):
+                self.inotify = None
+        self._nodes = set()
+        self._add_subtree(root)
+
+    def _add_subtree(self, top: str):
+        for dirpath, _, filenames in os.walk(top):
+            if self.inotify:
+                self.inotify.watch(dirpath)
+            if 'memory.current' in filenames:
+                self._nodes.add(os.path.relpath(dirpath, self.root))
+        self._reorder()
+
+    def _remove_subtree(self, rel: str):
+        prefix = rel + os.sep
+        self._nodes = {p for p in self._nodes if p != rel and not p.startswith(prefix)}
+        self._reorder()
+
+    def _reorder(self):
+        self.paths = sorted(self._nodes, key=lambda p: (-1 if p == '.' else p.count(os.sep), p))
+        for gone in set(self.history) - self._nodes:
+            del self.history[gone]
+
+    def refresh(self):
+        """处理目录树变化：有 inotify 时只应用事件，否则定期全量重新扫描"""
+        if self.inotify is None:
+            if self.ticks % CGROUP_RESCAN_TICKS == 0:
+                self._nodes = set()
+                self._add_subtree(self.root)
+            return
+        for parent, mask, name in self.inotify.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                self._nodes = set()
+                self._add_subtree(self.root)
+            elif mask & _IN_ISDIR and parent:
+                path = os.path.join(parent, name)
+                if mask & _IN_CREATE:
+                    self._add_subtree(path)
+                elif mask & _IN_DELETE:
+                    self._remove_subtree(os.path.relpath(path, self.root))
+
+    def _read_stat(self, path: str) -> Dict[str, int]:
+        stat = {}
+        with open(os.path.join(path, 'memory.stat')) as f:
+            for line in f:
+                key, _, value = line.partition(' ')
+                if key in _STAT_FIELDS:
+                    stat[key] = int(value)
+        return stat
+
+    def collect(self) -> List[CgroupMemoryInfo]:
+        """读取所有 cgroup 的内存用量并更新历史"""
+        self.refresh()
+        self.ticks += 1
+        mb = 1024 * 1024
+        limits: Dict[str, int] = {}
+        results = []
+        vanished = []
+        for rel in self.paths:
+            path = os.path.join(self.root, rel)
+            try:
+                current = _read_int(os.path.join(path, 'memory.current')) or 0
+                own_limit = _read_limit(path)
+                stat = self._read_stat(path)
+            except FileNotFoundError:
+                vanished.append(rel)
+                continue
+            except (OSError, ValueError):
+                continue
+            parent = os.path.dirname(rel)
+            while parent and parent not in limits:
+                parent = os.path.dirname(parent)
+            inherited = limits.get(parent or '.', self.total_bytes) if rel != '.' else self.total_bytes
+            limit = min(own_limit, inherited) if own_limit is not None else inherited
+            limits[rel] = limit
+            info = CgroupMemoryInfo(
+                path=rel,
+                name=os.path.basename(rel) if rel != '.' else '/',
+                memory_percent=current / limit * 100 if limit else 0.0,
+                memory_mb=current / mb,
+                limit_mb=limit / mb,
+                anon_mb=stat.get('anon', 0) / mb,
+                file_mb=stat.get('file', 0) / mb,
+            )
+            self.history[rel].append({'percent': info.memory_percent, 'mb': info.memory_mb})
+            results.append(info)
+        for rel in vanished:
+            self._remove_subtree(rel)
+        return results
+
+    def get_top_cgroups(self, limit: int = 10) -> List[CgroupMemoryInfo]:
+        """返回占自身限额比例最高的 cgroup"""
+        cgroups = self.collect()
+        cgroups.sort(key=lambda x: x.memory_percent, reverse=True)
+        self.latest = cgroups
+        return cgroups[:limit]
+
+    def get_spike_changes(self, cgroups: List[CgroupMemoryInfo]) -> List[float]:
+        """计算每个 cgroup 相对突变窗口均值的变化百分比，历史不足时为 0"""
+        changes = []
+        for cg in cgroups:
+            change_percent = 0.0
+            history = self.history.get(cg.path)
+            if history and len(history) >= SPIKE_CHECK_WINDOW:
+                old_values = list(history)[-SPIKE_CHECK_WINDOW:-1]
+                avg_old = sum(h['percent'] for h in old_values) / len(old_values)
+                if avg_old > 0:
+                    change_percent = (cg.memory_percent - avg_old) / avg_old * 100
+            changes.append(change_percent)
+        return changes
+
+    def detect_memory_spike(self, cgroups: List[CgroupMemoryInfo], spike_threshold: float = None) -> List[CgroupMemoryInfo]:
+        """检测内存突变的 cgroup"""
+        if spike_threshold is None:
+            spike_threshold = MEMORY_SPIKE_THRESHOLD
+        changes = self.get_spike_changes(cgroups)
+        return [cg for cg, change in zip(cgroups, changes) if change > spike_threshold]
+
+    def read_oom_kills(self) -> Dict[str, int]:
+        """读取各 cgroup memory.events 中的 oom_kill 计数"""
+        self.refresh()
+        counts = {}
+        for rel in self.paths:
+            try:
+                with open(os.path.join(self.root, rel, 'memory.events')) as f:
+                    for line in f:
+                        if line.startswith('oom_kill '):
+                            counts[rel] = int(line.split()[1])
+                            break
+            except (OSError, ValueError):
+                continue
+        return counts
+
+    def get_history(self, path: str) -> List[dict]:
+        return list(self.history.get(path, []))
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
@@ -4,3 +4,61 @@ MEMORY_SPIKE_THRESHOLD = 20  # 进程内存突变阈值(%)，短时间内变化
 MONITOR_INTERVAL = 2000  # 监控间隔(毫秒)
 HISTORY_LENGTH = 60  # 保存历史数据点数量（用于绘制走势图）
 SPIKE_CHECK_WINDOW = 5  # 检测内存突变的时间窗口（数据点数量）
+
+# 自监控性能剖析
+PROFILE_OUTPUT = 'profile.json'  # 退出时导出的剖析结果文件
+PROFILE_BUDGET_RSS_MB = 150  # 基准测试时自身内存预算(MB)
+PROFILE_BUDGET_CPU_PERCENT = 5  # 基准测试时自身CPU预算(%)
+PROFILE_BUDGET_ALLOC_BYTES = 4096  # 基准测试时每次采集净分配预算(字节)，持续超出说明有泄漏
+
+# 进程内存明细
+SMAPS_CACHE_TTL = 5  # 明细结果缓存有效期(秒)
+SMAPS_MAPPINGS_TTL = 60  # 完整 smaps 映射列表的刷新间隔(秒)，点击进程时按 SMAPS_CACHE_TTL 刷新
+SMAPS_CACHE_PIDS = 16  # 最多缓存多少个进程的明细和历史
+SMAPS_TOP_MAPPINGS = 5  # 显示占用最大的映射数量
+
+# cgroup v2 监控
+CGROUP_ROOT = '/sys/fs/cgroup'  # cgroup v2 挂载点
+CGROUP_RESCAN_TICKS = 30  # 无 inotify 时每隔多少次采集重新扫描目录树
+
+# asyncio 接口
+ASYNC_QUEUE_SIZE = 16  # 每个订阅者缓存的快照数量，满时丢弃最旧的
+
+# 并行扫描
+SCAN_WORKERS = 0  # 扫描 /proc 的工作线程数，0 表示根据扫描耗时自动选择
+SCAN_MAX_WORKERS = 8  # 自动模式下的最大工作线程数
+SCAN_BUDGET_FRACTION = 0.25  # 扫描耗时超过监控间隔的该比例时增加工作线程
+SCAN_TUNE_SAMPLES = 3  # 调整线程数后至少采集几次再比较扫描耗时
+
+# 事故现场记录
+FORENSIC_DIR = 'incidents'  # 事故文件目录(相对程序目录)
+FORENSIC_PRE_SECONDS = 60  # 触发前保留的快照时长(秒)
+FORENSIC_POST_SECONDS = 10  # 触发后继续记录的时长(秒)
+FORENSIC_SAMPLE_INTERVAL = 0.5  # 两次采集之间独立轻量采样的间隔(秒)，0 表示只记录采集时的完整快照
+FORENSIC_SAMPLE_TOP = 20  # 轻量采样读取 RSS 的进程数(上次完整扫描中占用最高的)
+FORENSIC_MAX_INCIDENTS = 50  # 最多保留的事故文件数量
+
+# 历史记录
+HISTORY_DIR = 'history'  # 历史记录目录(相对程序目录)
+HISTORY_RECORD_TOP = 20  # 每次采集记录的进程数量
+
+# 缺页与交换指标
+PAGING_MAX_PROCESSES = 20  # 读取缺页和交换计数的进程数量上限(按占用从高到低)
+PAGING_BUDGET_MS = 10  # 每次采集读取缺页指标的耗时预算(毫秒)，超出时减少覆盖的进程数
+PAGING_MAJFLT_THRESHOLD = 500  # 进程主缺页报警阈值(次/秒)，持续 10 秒触发
+
+# 分时段基线
+BASELINE_FILE = 'baselines.db'  # 基线数据文件(相对程序目录)
+BASELINE_MIN_SAMPLES = 30  # 时段内样本数达到此值后才用基线判断突变，否则退回近期窗口
+BASELINE_Z_THRESHOLD = 3  # 偏离时段均值超过多少个标准差才计为突变
+BASELINE_MIN_STD_RATIO = 0.05  # 标准差下限(相对均值的比例)
+BASELINE_FLUSH_TICKS = 150  # 每隔多少次采集把基线写回文件
+BASELINE_CACHE_LIMIT = 1024  # 内存中缓存的对象数量上限
+
+# 列式导出
+EXPORT_DIR = 'export'  # 导出目录(相对程序目录)
+EXPORT_FORMAT = 'auto'  # parquet | arrow | csv，auto 表示有 pyarrow 时用 parquet，否则 csv
+EXPORT_ROW_GROUP_ROWS = 16384  # 每个行组的行数，缓冲满即写出(进程表每行 56 字节，缓冲约 1MB)
+EXPORT_FLUSH_SECONDS = 300  # 缓冲最长保留时间(秒)，数据较少时也定期写出
+EXPORT_ROTATE_MB = 256  # 单个文件超过此大小后换新文件，0 表示不限
+EXPORT_ROTATE_SECONDS = 86400  # 单个文件最长覆盖时长(秒)，0 表示不限
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""流式列式导出：把系统和进程序列按行组写入 Parquet / Arrow IPC 文件，无 pyarrow 时写 CSV
+
+输出目录中每张表单独成文件并按大小或时长轮转:
+    export/system-20261019-081500.parquet     time, percent, pgmajfault, pswpin, pswpout, pgscan, pgsteal
+    export/processes-20261019-081500.parquet  time, pid, name, percent, mb, majflt, swap_mb
+"""
+import csv
+import os
+import time
+from array import array
+from typing import Dict, List, Optional
+from memory_monitor import NameTable, ProcessSnapshot
+from paging import VMSTAT_METRICS, ProcessPaging
+from config import (EXPORT_DIR, EXPORT_FORMAT, EXPORT_ROW_GROUP_ROWS, EXPORT_FLUSH_SECONDS, EXPORT_ROTATE_MB,
+                    EXPORT_ROTATE_SECONDS)
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = ('parquet', 'arrow', 'csv')
+_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+_NAN = float('nan')
+
+
+def _arrow_type(col: array):
+    if col.typecode == 'd':
+        return pa.float64()
+    return pa.int64() if col.itemsize == 8 else pa.int32()
+
+
+def resolve_format(fmt: str = EXPORT_FORMAT) -> str:
+    """auto 时有 pyarrow 用 Parquet，否则用 CSV；指定列式格式但缺少 pyarrow 时同样退回 CSV"""
+    if fmt not in FORMATS and fmt != 'auto':
+        raise ValueError(f"未知导出格式: {fmt}")
+    if pa is None:
+        return 'csv'
+    return 'parquet' if fmt == 'auto' else fmt
+
+
+class _Table:
+    """一张表的列缓冲和当前输出文件；缓冲满一个行组即写出，内存占用与导出时长无关"""
+
+    def __init__(self, exporter: 'ColumnarExporter', name: str, columns: Dict[str, str]):
+        self.exporter = exporter
+        self.name = name
+        self.types = columns  # 列名 -> array 类型码，'name' 列为名称表下标
+        self.columns = {c: array(t) for c, t in columns.items()}
+        self.writer = None
+        self.file = None
+        self.path: Optional[str] = None
+        self.opened_at = 0.0  # 当前文件第一行的数据时间
+        self.buffered_at: Optional[float] = None  # 缓冲中最早一行的数据时间
+        self.rows_written = 0
+        self.files: List[str] = []
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values())))
+
+    def maybe_flush(self, now: float):
+        """缓冲满一个行组，或最早一行已缓冲超过 flush_seconds 时写出"""
+        if self.buffered_at is None:
+            self.buffered_at = now
+        if (len(self) >= self.exporter.row_group_rows
+                or now - self.buffered_at >= self.exporter.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        """写出缓冲；轮转判断和文件命名都用数据时间而非当前时间，导出历史时同样适用"""
+        if not len(self):
+            return
+        first = self.buffered_at
+        if self.writer is None or self._should_rotate(first):
+            self._open(first)
+        fmt = self.exporter.format
+        if fmt == 'csv':
+            self._write_csv()
+        else:
+            batch = self._record_batch()
+            if fmt == 'parquet':
+                self.writer.write_batch(batch, row_group_size=len(self))
+            else:
+                self.writer.write_batch(batch)
+        self.rows_written += len(self)
+        for col in self.columns.values():
+            del col[:]
+        self.buffered_at = None
+
+    def _record_batch(self):
+        arrays = []
+        for c, col in self.columns.items():
+            # 数组内容按字节复制为 Arrow 缓冲区，不逐个转换 Python 对象
+            arr = pa.Array.from_buffers(_arrow_type(col), len(col), [None, pa.py_buffer(col.tobytes())])
+            if c == 'name':
+                # IPC 文件格式不允许跨批替换字典，写入前展开为字符串列
+                arr = pa.DictionaryArray.from_arrays(arr, pa.array(self.exporter.names.names, pa.string()))
+                arr = arr.cast(pa.string())
+            arrays.append(arr)
+        return pa.record_batch(arrays, schema=self._schema())
+
+    def _schema(self):
+        return pa.schema([pa.field(c, pa.string() if c == 'name' else _arrow_type(col))
+                          for c, col in self.columns.items()])
+
+    def _write_csv(self):
+        names = self.exporter.names.names
+        cols = [[names[i] for i in col] if c == 'name' else col for c, col in self.columns.items()]
+        # 缺失值写为 nan，pandas 和 DuckDB 均按 NaN 读取
+        self.writer.writerows(zip(*cols))
+        self.file.flush()
+
+    def _should_rotate(self, t: float) -> bool:
+        exporter = self.exporter
+        if exporter.rotate_seconds and t - self.opened_at >= exporter.rotate_seconds:
+            return True
+        return bool(exporter.rotate_bytes) and os.path.getsize(self.path) >= exporter.rotate_bytes
+
+    def _open(self, first: float):
+        self.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(first))
+        base = os.path.join(self.exporter.directory, f"{self.name}-{stamp}")
+        path, n = base + _EXTENSIONS[self.exporter.format], 1
+        while os.path.exists(path):
+            path = f"{base}-{n}{_EXTENSIONS[self.exporter.format]}"
+            n += 1
+        fmt = self.exporter.format
+        if fmt == 'csv':
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(list(self.types))
+        elif fmt == 'parquet':
+            self.writer = pq.ParquetWriter(path, self._schema(), compression='zstd')
+        else:
+            self.file = pa.OSFile(path, 'wb')
+            self.writer = pa.ipc.new_file(self.file, self._schema())
+        self.path = path
+        self.opened_at = first
+        self.files.append(path)
+
+    def close(self):
+        if self.writer is not None and self.exporter.format != 'csv':
+            self.writer.close()
+        if self.file is not None:
+            self.file.close()
+        self.writer = None
+        self.file = None
+
+
+class ColumnarExporter:
+    """按采集逐次追加数据，进程表直接从结构数组快照批量复制"""
+
+    def __init__(self, directory: str = EXPORT_DIR, fmt: str = EXPORT_FORMAT,
+                 row_group_rows: int = EXPORT_ROW_GROUP_ROWS, rotate_mb: float = EXPORT_ROTATE_MB,
+                 rotate_seconds: float = EXPORT_ROTATE_SECONDS, flush_seconds: float = EXPORT_FLUSH_SECONDS,
+                 names: NameTable = None):
+        self.directory = directory
+        self.format = resolve_format(fmt)
+        self.row_group_rows = row_group_rows
+        self.rotate_bytes = int(rotate_mb * 1024 * 1024)
+        self.rotate_seconds = rotate_seconds
+        self.flush_seconds = flush_seconds
+        # 与监控器共用名称表时名称下标可直接复制
+        self.names = names or NameTable()
+        os.makedirs(directory, exist_ok=True)
+        self.system = _Table(self, 'system', {'time': 'd', 'percent': 'd', **dict.fromkeys(VMSTAT_METRICS, 'd')})
+        self.processes = _Table(self, 'processes', {'time': 'd', 'pid': 'l', 'name': 'l', 'percent': 'd',
+                                                    'mb': 'd', 'majflt': 'd', 'swap_mb': 'd'})
+
+    def write(self, system_percent: float, snap: ProcessSnapshot, now: float = None,
+              paging: dict = None, rates: Dict[str, float] = None):
+        """追加一次采集：系统一行，快照中每个进程一行；paging 为 pid -> ProcessPaging，缺失记为 NaN"""
+        if now is None:
+            now = time.time()
+        cols = self.system.columns
+        cols['time'].append(now)
+        cols['percent'].append(system_percent)
+        for metric in VMSTAT_METRICS:
+            cols[metric].append(rates.get(metric, _NAN) if rates else _NAN)
+
+        cols = self.processes.columns
+        n = len(snap)
+        cols['time'].extend(array('d', [now]) * n)
+        cols['pid'].extend(snap.pids)
+        if snap.names is self.names:
+            cols['name'].extend(snap.name_ids)
+        else:
+            src = snap.names.names
+            cols['name'].extend(self.names.intern(src[i]) for i in snap.name_ids)
+        cols['percent'].extend(snap.percents)
+        cols['mb'].extend(snap.mbs)
+        if paging:
+            found = [paging.get(pid) for pid in snap.pids]
+            cols['majflt'].extend(_NAN if pg is None else pg.majflt for pg in found)
+            cols['swap_mb'].extend(_NAN if pg is None else pg.swap_mb for pg in found)
+        else:
+            cols['majflt'].extend(array('d', [_NAN]) * n)
+            cols['swap_mb'].extend(array('d', [_NAN]) * n)
+
+        self.system.maybe_flush(now)
+        self.processes.maybe_flush(now)
+
+    def write_record(self, record: dict):
+        """追加一条历史记录(history_store 的 JSON 行格式)"""
+        snap = ProcessSnapshot(self.names)
+        paging = {}
+        for row in record['p']:
+            snap.append(row[0], row[1], row[2], row[3])
+            if len(row) > 5:
+                paging[row[0]] = ProcessPaging(_NAN, row[4], row[5])
+        self.write(record['s'], snap, record['t'], paging, record.get('v'))
+
+    def flush(self):
+        self.system.flush()
+        self.processes.flush()
+
+    def close(self):
+        """写出剩余缓冲并关闭文件"""
+        self.flush()
+        self.system.close()
+        self.processes.close()
+
+    @property
+    def files(self) -> List[str]:
+        return self.system.files + self.processes.files
+
+
+def export_history(store, exporter: ColumnarExporter, start: float, end: float) -> int:
+    """把历史记录流式导出，返回导出的记录数"""
+    count = 0
+    for record in store.records(start, end):
+        exporter.write_record(record)
+        count += 1
+    return count
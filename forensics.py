@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""事故现场记录模块：内存压力或 OOM 时保存触发前后的快照
+
+每次界面采集保存一份完整快照；两次采集之间由独立线程按 FORENSIC_SAMPLE_INTERVAL 轻量采样，
+只读取系统占比和上次完整扫描中占用最高进程的 RSS，后台低频采集时触发前后同样有足够的样本。
+"""
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import psutil
+from cgroup_monitor import cgroup_usage
+from memory_monitor import NameTable, ProcessSnapshot
+from config import (FORENSIC_DIR, FORENSIC_PRE_SECONDS, FORENSIC_POST_SECONDS, FORENSIC_MAX_INCIDENTS,
+                    FORENSIC_SAMPLE_INTERVAL, FORENSIC_SAMPLE_TOP)
+
+
+def read_vmstat_oom_kills(path: str = '/proc/vmstat') -> Optional[int]:
+    """系统级 oom_kill 计数(Linux 4.13+)，不可用时返回 None"""
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith('oom_kill '):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class _Sample:
+    """一次采样，名称下标指向记录器共享的名称表；full 为 False 时只含占用最高的进程"""
+    __slots__ = ('timestamp', 'system_percent', 'pids', 'percents', 'mbs', 'name_ids', 'full')
+
+    def __init__(self, timestamp: float, system_percent: float, pids: array, percents: array,
+                 mbs: array, name_ids: array, full: bool = True):
+        self.timestamp = timestamp
+        self.system_percent = system_percent
+        self.pids = pids
+        self.percents = percents
+        self.mbs = mbs
+        self.name_ids = name_ids
+        self.full = full
+
+    @classmethod
+    def from_snapshot(cls, timestamp: float, system_percent: float, snap: ProcessSnapshot,
+                      names: NameTable) -> '_Sample':
+        """完整快照的副本"""
+        if snap.names is names:
+            name_ids = array('l', snap.name_ids)
+        else:
+            src = snap.names.names
+            name_ids = array('l', (names.intern(src[i]) for i in snap.name_ids))
+        return cls(timestamp, system_percent, array('l', snap.pids), array('d', snap.percents),
+                   array('d', snap.mbs), name_ids)
+
+    def to_dict(self) -> dict:
+        return {
+            'timestamp': self.timestamp,
+            'system_percent': self.system_percent,
+            'pids': self.pids.tolist(),
+            'percents': self.percents.tolist(),
+            'mbs': self.mbs.tolist(),
+            'name_ids': self.name_ids.tolist(),
+            'full': self.full,
+        }
+
+
+class ForensicRecorder:
+    """采集线程只做内存中的追加，轻量采样和压缩写盘各在后台线程完成"""
+
+    def __init__(self, directory: str = FORENSIC_DIR, pre_seconds: float = FORENSIC_PRE_SECONDS,
+                 post_seconds: float = FORENSIC_POST_SECONDS, max_incidents: int = FORENSIC_MAX_INCIDENTS,
+                 names: NameTable = None, sample_interval: float = FORENSIC_SAMPLE_INTERVAL,
+                 cgroup_path: str = None):
+        self.directory = directory
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_incidents = max_incidents
+        # 与监控器共用名称表时快照可直接按数组复制
+        self.names = names or NameTable()
+        self.buffer: deque = deque()
+        self.incident: Optional[dict] = None
+        self.lock = threading.Lock()  # 保护 buffer 和 incident，采集线程与采样线程共用
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='forensics')
+        self._oom_system: Optional[int] = read_vmstat_oom_kills()
+        self._oom_cgroups: Optional[Dict[str, int]] = None  # 各 cgroup 的 oom_kill 计数，首次检查时读取
+        self.sample_interval = sample_interval
+        self.cgroup_path = cgroup_path  # 在容器中时系统占比按限额计算，与监控器一致
+        self._top: Tuple[array, array] = (array('l'), array('l'))  # 轻量采样的 (pid, 名称下标)
+        self._procs: Dict[int, psutil.Process] = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        if sample_interval > 0:
+            self._sampler = threading.Thread(target=self._sample_loop, name='forensics-sampler', daemon=True)
+            self._sampler.start()
+
+    def record(self, system_percent: float, snap: ProcessSnapshot, now: float = None):
+        """保存本次采集的完整快照，并推进正在进行的事故记录"""
+        if now is None:
+            now = time.time()
+        sample = _Sample.from_snapshot(now, system_percent, snap, self.names)
+        top = snap.top_indexes(FORENSIC_SAMPLE_TOP)
+        self._top = (array('l', (sample.pids[i] for i in top)), array('l', (sample.name_ids[i] for i in top)))
+        self._append(sample)
+
+    def _append(self, sample: _Sample):
+        with self.lock:
+            self.buffer.append(sample)
+            while self.buffer and sample.timestamp - self.buffer[0].timestamp > self.pre_seconds:
+                self.buffer.popleft()
+            if self.incident is not None:
+                self.incident['post'].append(sample)
+                if sample.timestamp - self.incident['triggered_at'] >= self.post_seconds:
+                    self._flush()
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.sample_interval):
+            pids, name_ids = self._top
+            if pids:
+                self._append(self._sample_top(pids, name_ids))
+
+    def _sample_top(self, pids: array, name_ids: array) -> _Sample:
+        """只读取系统内存和指定进程的 RSS，开销远小于完整扫描"""
+        mem = psutil.virtual_memory()
+        system_percent, total = mem.percent, mem.total
+        if self.cgroup_path:
+            usage = cgroup_usage(self.cgroup_path)
+            if usage and usage[1] < mem.total:
+                system_percent = usage[0] / usage[1] * 100
+        alive = set(pids)
+        for pid in [pid for pid in self._procs if pid not in alive]:
+            del self._procs[pid]
+        sample = _Sample(time.time(), system_percent, array('l'), array('d'), array('d'), array('l'), full=False)
+        mb = 1024 * 1024
+        for pid, name_id in zip(pids, name_ids):
+            try:
+                proc = self._procs.get(pid)
+                if proc is None:
+                    proc = self._procs[pid] = psutil.Process(pid)
+                rss = proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            sample.pids.append(pid)
+            sample.percents.append(rss / total * 100)
+            sample.mbs.append(rss / mb)
+            sample.name_ids.append(name_id)
+        return sample
+
+    def trigger(self, reason: str, now: float = None):
+        """触发一次事故记录；记录进行中再次触发只追加原因"""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            if self.incident is not None:
+                self.incident['reasons'].append(reason)
+                return
+            self.incident = {'triggered_at': now, 'reasons': [reason], 'pre': list(self.buffer), 'post': []}
+
+    def check_oom(self, cgroups=None) -> List[str]:
+        """比较 oom_kill 计数，返回新发生 OOM 的对象并触发记录
+
+        以 /proc/vmstat 的系统计数作为触发条件，只在其增加时才逐个读取各 cgroup 的 memory.events；
+        vmstat 不可用时退回每次读取。
+        """
+        victims = []
+        count = read_vmstat_oom_kills()
+        rose = count is not None and self._oom_system is not None and count > self._oom_system
+        if rose:
+            victims.append('system')
+        self._oom_system = count
+        if cgroups is not None and (rose or count is None or self._oom_cgroups is None):
+            counts = cgroups.read_oom_kills()
+            if self._oom_cgroups is not None:
+                for path, n in counts.items():
+                    # 系统计数增加时，期间新建的 cgroup 也可能是 OOM 对象
+                    if n > self._oom_cgroups.get(path, 0 if rose else n):
+                        victims.append(path)
+            self._oom_cgroups = counts
+        if victims:
+            self.trigger('OOM: ' + ', '.join(victims))
+        return victims
+
+    def _flush(self):
+        incident, self.incident = self.incident, None
+        self.writer.submit(self._write, incident).add_done_callback(self._write_done)
+
+    def _write_done(self, future: Future):
+        """写盘在后台线程执行，异常不会传回采集线程，在此输出"""
+        if not future.cancelled() and future.exception() is not None:
+            print(f"事故记录写入失败: {future.exception()}", file=sys.stderr)
+
+    def _write(self, incident: dict):
+        names = list(self.names.names)  # 名称表只追加，复制时已有下标都有效
+        os.makedirs(self.directory, exist_ok=True)
+        ts = incident['triggered_at']
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(ts)) + f"-{int(ts * 1000) % 1000:03d}"
+        path = os.path.join(self.directory, f"incident-{stamp}.json.gz")
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump({
+                'triggered_at': incident['triggered_at'],
+                'reasons': incident['reasons'],
+                'names': names,
+                'samples': [s.to_dict() for s in incident['pre'] + incident['post']],
+            }, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        for old in sorted(glob.glob(os.path.join(self.directory, 'incident-*.json.gz')))[:-self.max_incidents]:
+            os.remove(old)
+
+    def close(self):
+        """停止采样并写出进行中的事故记录"""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        with self.lock:
+            if self.incident is not None:
+                self._flush()
+        self.writer.shutdown(wait=True)
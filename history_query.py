@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""历史记录查询工具
+
+示例:
+    python history_query.py top --from "2026-10-18 02:00" --to "2026-10-18 03:00" -k 10
+    python history_query.py percentile -p 95 --from -7d
+    python history_query.py percentile -p 95 --name Chrome --from -1d --format json
+    python history_query.py range --name Chrome --from -1h --format csv
+    python history_query.py index
+    python history_query.py baseline --from -28d
+    python history_query.py export --from -1d --out export --format parquet
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Iterable, List
+from history_store import HistoryStore
+from baseline import BaselineModel
+from exporter import ColumnarExporter, export_history, FORMATS
+from config import HISTORY_DIR, BASELINE_FILE, EXPORT_DIR
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_time(value: str) -> float:
+    """支持 now、相对时间(-30m、-7d)、ISO 格式本地时间或时间戳"""
+    value = value.strip()
+    if value == 'now':
+        return time.time()
+    if value.startswith('-') and value[-1] in _UNITS:
+        return time.time() - float(value[1:-1]) * _UNITS[value[-1]]
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class Output:
+    """把逐行结果以表格、CSV 或 JSON 流式写出"""
+
+    def __init__(self, fmt: str, columns: List[str], stream=sys.stdout):
+        self.fmt = fmt
+        self.columns = columns
+        self.stream = stream
+        self.count = 0
+        if fmt == 'csv':
+            self.writer = csv.writer(stream)
+            self.writer.writerow(columns)
+        elif fmt == 'table':
+            stream.write(' '.join(f"{c:>16}" for c in columns) + '\n')
+        else:
+            stream.write('[')
+
+    def row(self, row: dict):
+        values = [row[c] for c in self.columns]
+        if self.fmt == 'csv':
+            self.writer.writerow(values)
+        elif self.fmt == 'table':
+            self.stream.write(' '.join(f"{v:>16.2f}" if isinstance(v, float) else f"{'' if v is None else v:>16}"
+                                       for v in values) + '\n')
+        else:
+            self.stream.write((',' if self.count else '') + '\n  ' + json.dumps(row, ensure_ascii=False))
+        self.count += 1
+
+    def rows(self, rows: Iterable[dict]):
+        for row in rows:
+            self.row(row)
+        self.close()
+
+    def close(self):
+        if self.fmt == 'json':
+            self.stream.write('\n]\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), HISTORY_DIR),
+                        help='历史记录目录')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_range(p):
+        p.add_argument('--from', dest='start', default='-1d', help='开始时间 (默认 -1d)')
+        p.add_argument('--to', dest='end', default='now', help='结束时间 (默认 now)')
+        p.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+
+    top = sub.add_parser('top', help='时间范围内内存占用最高的进程')
+    add_range(top)
+    top.add_argument('-k', type=int, default=10)
+    top.add_argument('--by', choices=('peak_mb', 'avg_mb', 'peak_percent'), default='peak_mb')
+
+    pct = sub.add_parser('percentile', help='系统或指定进程(MB)的百分位数')
+    add_range(pct)
+    pct.add_argument('-p', type=float, default=95)
+    pct.add_argument('--name', help='进程名，不指定时统计系统内存占比')
+
+    rng = sub.add_parser('range', help='导出指定进程的逐点数据')
+    add_range(rng)
+    rng.add_argument('--name', required=True)
+
+    sub.add_parser('index', help='为缺少索引的历史分段补建索引')
+
+    base = sub.add_parser('baseline', help='用历史记录训练分时段基线(跳过已学习的部分)')
+    base.add_argument('--from', dest='start', default='-28d', help='开始时间 (默认 -28d)')
+    base.add_argument('--to', dest='end', default='now', help='结束时间 (默认 now)')
+    base.add_argument('--file', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), BASELINE_FILE),
+                      help='基线数据文件')
+
+    exp = sub.add_parser('export', help='把历史记录导出为 Parquet / Arrow IPC / CSV 文件')
+    exp.add_argument('--from', dest='start', default='-1d', help='开始时间 (默认 -1d)')
+    exp.add_argument('--to', dest='end', default='now', help='结束时间 (默认 now)')
+    exp.add_argument('--out', default=EXPORT_DIR, help='输出目录')
+    exp.add_argument('--format', choices=('auto',) + FORMATS, default='auto',
+                     help='auto 表示有 pyarrow 时用 parquet，否则 csv')
+
+    # "-7d" 这类以 - 开头的值会被 argparse 当作选项，先改写为 --from=-7d
+    argv, it = [], iter(sys.argv[1:])
+    for arg in it:
+        argv.append(f"{arg}={next(it, '')}" if arg in ('--from', '--to') else arg)
+    args = parser.parse_args(argv)
+    store = HistoryStore(args.dir)
+    if args.command == 'index':
+        print(f"补建索引 {store.build_missing_indexes()} 个")
+        return
+
+    start, end = parse_time(args.start), parse_time(args.end)
+    if args.command == 'baseline':
+        model = BaselineModel(args.file)
+        try:
+            print(f"学习记录 {model.train(store, start, end)} 条")
+        finally:
+            model.close()
+        return
+    if args.command == 'export':
+        exporter = ColumnarExporter(args.out, args.format)
+        try:
+            count = export_history(store, exporter, start, end)
+        finally:
+            exporter.close()
+        print(f"导出记录 {count} 条 ({exporter.format}):")
+        for path in exporter.files:
+            print(f"  {path}")
+        return
+    if args.command == 'top':
+        Output(args.format, ['name', 'peak_mb', 'avg_mb', 'peak_percent', 'samples']).rows(
+            store.top(start, end, args.k, args.by))
+    elif args.command == 'percentile':
+        if args.name:
+            value = store.process_percentile(args.name, start, end, args.p)
+        else:
+            value = store.system_percentile(start, end, args.p)
+        Output(args.format, ['target', 'p', 'value']).rows(
+            [{'target': args.name or 'system', 'p': args.p, 'value': value if value is not None else ''}])
+    else:
+        Output(args.format, ['time', 'pid', 'name', 'percent', 'mb', 'majflt', 'swap_mb']).rows(
+            {**row, 'time': datetime.fromtimestamp(row['time']).isoformat(timespec='seconds')}
+            for row in store.process_series(args.name, start, end))
+
+
+if __name__ == "__main__":
+    main()
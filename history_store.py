@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""历史记录存储：按小时分段的 JSON Lines 文件，每段附带汇总索引
+
+目录结构:
+    history/20261018-02.jsonl      每行一次采集 {"t": 时间戳, "s": 系统占比, "p": [[pid, 名称, 占比, MB], ...]}
+                                   有缺页数据时进程行追加 [主缺页/秒, 交换MB]，"v" 为系统级换页速率
+    history/20261018-02.idx.json   整段汇总(系统占比直方图、各进程名峰值/累计值和 MB 直方图)和每分钟起始字节偏移
+    history/20261018-02.min.json   每分钟的汇总，只在查询范围首尾不完整的小时使用
+"""
+import calendar
+import glob
+import json
+import math
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import HISTORY_DIR, HISTORY_RECORD_TOP
+
+SEGMENT_SECONDS = 3600
+MINUTES = SEGMENT_SECONDS // 60
+HIST_BINS = 1001  # 系统占比直方图：0.0% ~ 100.0%，每 0.1% 一格
+MB_BIN_LOG = math.log(1.01)  # 进程 MB 直方图按对数分格，相邻格相差 1%
+
+
+def segment_name(t: float) -> str:
+    return time.strftime('%Y%m%d-%H', time.gmtime(t))
+
+
+def segment_start(name: str) -> int:
+    return calendar.timegm(time.strptime(name, '%Y%m%d-%H'))
+
+
+def percent_bin(percent: float) -> int:
+    return min(HIST_BINS - 1, max(0, int(round(percent * 10))))
+
+
+def mb_bin(mb: float) -> int:
+    return int(round(math.log1p(max(0.0, mb)) / MB_BIN_LOG))
+
+
+def mb_bin_value(b: int) -> float:
+    """格的代表值，与原值相差不超过 0.5%"""
+    return round(math.expm1(b * MB_BIN_LOG), 1)
+
+
+class SegmentSummary:
+    """一个时间段的汇总：系统占比直方图，各进程名 [峰值MB, MB合计, 次数, 峰值占比] 和 MB 直方图"""
+
+    def __init__(self):
+        self.count = 0
+        self.system_hist: Dict[int, int] = {}
+        self.names: Dict[str, List[float]] = {}
+        self.name_hist: Dict[str, Dict[int, int]] = {}
+
+    def add(self, system_percent: float, processes):
+        self.count += 1
+        b = percent_bin(system_percent)
+        self.system_hist[b] = self.system_hist.get(b, 0) + 1
+        for row in processes:
+            name, percent, mb = row[1], row[2], row[3]
+            agg = self.names.get(name)
+            if agg is None:
+                self.names[name] = [mb, mb, 1, percent]
+            else:
+                if mb > agg[0]:
+                    agg[0] = mb
+                agg[1] += mb
+                agg[2] += 1
+                if percent > agg[3]:
+                    agg[3] = percent
+            hist = self.name_hist.get(name)
+            if hist is None:
+                hist = self.name_hist[name] = {}
+            b = mb_bin(mb)
+            hist[b] = hist.get(b, 0) + 1
+
+    def merge(self, other: 'SegmentSummary'):
+        self.count += other.count
+        for b, n in other.system_hist.items():
+            self.system_hist[b] = self.system_hist.get(b, 0) + n
+        for name, (peak, total, n, peak_pct) in other.names.items():
+            agg = self.names.get(name)
+            if agg is None:
+                self.names[name] = [peak, total, n, peak_pct]
+            else:
+                agg[0] = max(agg[0], peak)
+                agg[1] += total
+                agg[2] += n
+                agg[3] = max(agg[3], peak_pct)
+        for name, other_hist in other.name_hist.items():
+            hist = self.name_hist.get(name)
+            if hist is None:
+                self.name_hist[name] = dict(other_hist)
+                continue
+            for b, n in other_hist.items():
+                hist[b] = hist.get(b, 0) + n
+
+    def to_dict(self) -> dict:
+        return {'count': self.count,
+                'system_hist': {str(b): n for b, n in self.system_hist.items()}, 'names': self.names,
+                'name_hist': {name: {str(b): n for b, n in hist.items()} for name, hist in self.name_hist.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SegmentSummary':
+        summary = cls()
+        summary.count = data['count']
+        summary.system_hist = {int(b): n for b, n in data['system_hist'].items()}
+        summary.names = data['names']
+        summary.name_hist = {name: {int(b): n for b, n in hist.items()} for name, hist in data['name_hist'].items()}
+        return summary
+
+
+def _hist_percentile(hist: Dict[int, int], p: float) -> Optional[int]:
+    """直方图中第 p 百分位所在的格(最近秩法)，为空时返回 None"""
+    count = sum(hist.values())
+    if not count:
+        return None
+    target = count * p / 100
+    seen = 0
+    for b in sorted(hist):
+        seen += hist[b]
+        if seen >= target:
+            return b
+    return None
+
+
+class SegmentIndex:
+    """一个小时分段的索引：整段汇总、每分钟汇总和每分钟起始偏移"""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.hour = SegmentSummary()
+        self.minutes: List[Optional[SegmentSummary]] = [None] * MINUTES
+        self.offsets: List[Optional[int]] = [None] * MINUTES
+
+    def add(self, offset: int, record: dict):
+        m = min(MINUTES - 1, max(0, int((record['t'] - self.start) // 60)))
+        if self.offsets[m] is None:
+            self.offsets[m] = offset
+        if self.minutes[m] is None:
+            self.minutes[m] = SegmentSummary()
+        self.hour.add(record['s'], record['p'])
+        self.minutes[m].add(record['s'], record['p'])
+
+    def offset_for(self, t: float) -> int:
+        """时间 t 所在分钟或之后第一条记录的字节偏移，没有时返回 -1"""
+        m = min(MINUTES - 1, max(0, int((t - self.start) // 60)))
+        for offset in self.offsets[m:]:
+            if offset is not None:
+                return offset
+        return -1
+
+    def save(self, base: str):
+        _write_json(base + '.min.json', [m.to_dict() if m else None for m in self.minutes])
+        # 整段索引最后写出，它的修改时间用于判断索引是否有效
+        _write_json(base + '.idx.json', {'start': self.start, 'hour': self.hour.to_dict(), 'offsets': self.offsets})
+
+    @classmethod
+    def load(cls, base: str, minutes: bool = False) -> 'SegmentIndex':
+        with open(base + '.idx.json', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(data['start'])
+        index.hour = SegmentSummary.from_dict(data['hour'])
+        index.offsets = data['offsets']
+        if minutes:
+            with open(base + '.min.json', encoding='utf-8') as f:
+                index.minutes = [SegmentSummary.from_dict(m) if m else None for m in json.load(f)]
+        return index
+
+    @classmethod
+    def build(cls, path: str, start: int) -> 'SegmentIndex':
+        index = cls(start)
+        for offset, record in iter_segment(path):
+            index.add(offset, record)
+        return index
+
+
+def _write_json(path: str, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def iter_segment(path: str, offset: int = 0, end: float = None) -> Iterator[Tuple[int, dict]]:
+    """从字节偏移处逐行读取分段文件，返回 (偏移, 记录)；遇到 end 之后的记录即停止"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                offset += len(line)
+                continue  # 写入中断留下的半行
+            if end is not None and record['t'] >= end:
+                return
+            yield offset, record
+            offset += len(line)
+
+
+class HistoryRecorder:
+    """把每次采集追加到当前小时的分段文件，换段时写出上一段的索引"""
+
+    def __init__(self, directory: str = HISTORY_DIR, top: int = HISTORY_RECORD_TOP):
+        self.directory = directory
+        self.top = top
+        self.segment: Optional[str] = None
+        self.file = None
+        self.index: Optional[SegmentIndex] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, system_percent: float, processes, now: float = None,
+               paging: dict = None, rates: Dict[str, float] = None):
+        """paging 为 pid -> ProcessPaging，rates 为系统级换页速率"""
+        if now is None:
+            now = time.time()
+        name = segment_name(now)
+        if name != self.segment:
+            self._open(name)
+        rows = []
+        for p in processes[:self.top]:
+            row = [p.pid, p.name, round(p.memory_percent, 3), round(p.memory_mb, 1)]
+            pg = paging.get(p.pid) if paging else None
+            if pg is not None:
+                row += [round(pg.majflt, 1), round(pg.swap_mb, 1)]
+            rows.append(row)
+        record = {'t': round(now, 3), 's': round(system_percent, 2), 'p': rows}
+        if rates:
+            record['v'] = {k: round(v, 1) for k, v in rates.items()}
+        offset = self.file.tell()
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode() + b'\n')
+        self.file.flush()
+        self.index.add(offset, record)
+
+    def _open(self, name: str):
+        self.close()
+        path = os.path.join(self.directory, name + '.jsonl')
+        # 重启后续写同一小时时，先从已有数据恢复索引
+        start = segment_start(name)
+        self.index = SegmentIndex.build(path, start) if os.path.exists(path) else SegmentIndex(start)
+        self.file = open(path, 'ab')
+        self.segment = name
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.index.save(os.path.join(self.directory, self.segment))
+        self.file = None
+        self.segment = None
+
+
+class HistoryStore:
+    """只读访问历史目录：完整覆盖的小时和分钟直接用索引，只有首尾不足一分钟的部分扫描原始数据"""
+
+    def __init__(self, directory: str = HISTORY_DIR):
+        self.directory = directory
+
+    def segments(self, start: float, end: float) -> List[Tuple[int, str]]:
+        result = []
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.jsonl'))):
+            try:
+                seg_start = segment_start(os.path.basename(path)[:-len('.jsonl')])
+            except ValueError:
+                continue
+            if seg_start < end and seg_start + SEGMENT_SECONDS > start:
+                result.append((seg_start, path))
+        return result
+
+    def load_index(self, path: str, minutes: bool = False) -> Optional[SegmentIndex]:
+        base = path[:-len('.jsonl')]
+        # 索引早于数据文件说明该段仍在写入，不能使用
+        if not os.path.exists(base + '.idx.json') or os.path.getmtime(base + '.idx.json') < os.path.getmtime(path):
+            return None
+        try:
+            return SegmentIndex.load(base, minutes)
+        except KeyError:
+            return None  # 旧版本索引缺少字段，按无索引处理，可用 index 命令重建
+
+    def _scan(self, path: str, offset: int, t0: float, t1: float, summary: SegmentSummary):
+        if offset < 0:
+            return
+        for _, record in iter_segment(path, offset, t1):
+            if record['t'] >= t0:
+                summary.add(record['s'], record['p'])
+
+    def summarize(self, start: float, end: float) -> SegmentSummary:
+        """汇总时间范围 [start, end)"""
+        total = SegmentSummary()
+        for seg_start, path in self.segments(start, end):
+            seg_end = seg_start + SEGMENT_SECONDS
+            if seg_start >= start and seg_end <= end:
+                index = self.load_index(path)
+                if index is not None:
+                    total.merge(index.hour)
+                    continue
+            t0, t1 = max(start, seg_start), min(end, seg_end)
+            index = self.load_index(path, minutes=True)
+            if index is None:
+                self._scan(path, 0, t0, t1, total)
+                continue
+            # 完整覆盖的分钟用分钟汇总，首尾不完整的分钟按偏移定位后扫描
+            m0 = math.ceil((t0 - seg_start) / 60)
+            m1 = int((t1 - seg_start) // 60)
+            if m0 >= m1:
+                self._scan(path, index.offset_for(t0), t0, t1, total)
+                continue
+            for m in range(m0, m1):
+                if index.minutes[m] is not None:
+                    total.merge(index.minutes[m])
+            head_end, tail_start = seg_start + m0 * 60, seg_start + m1 * 60
+            if t0 < head_end:
+                self._scan(path, index.offset_for(t0), t0, head_end, total)
+            if tail_start < t1:
+                self._scan(path, index.offset_for(tail_start), tail_start, t1, total)
+        return total
+
+    def top(self, start: float, end: float, k: int = 10, key: str = 'peak_mb') -> List[dict]:
+        summary = self.summarize(start, end)
+        rows = [{'name': n, 'peak_mb': peak, 'avg_mb': total / cnt, 'peak_percent': pct, 'samples': cnt}
+                for n, (peak, total, cnt, pct) in summary.names.items()]
+        rows.sort(key=lambda r: r[key], reverse=True)
+        return rows[:k]
+
+    def system_percentile(self, start: float, end: float, p: float) -> Optional[float]:
+        summary = self.summarize(start, end)
+        b = _hist_percentile(summary.system_hist, p)
+        return None if b is None else b / 10
+
+    def records(self, start: float, end: float) -> Iterator[dict]:
+        """按时间顺序流式返回 [start, end) 内的原始记录"""
+        for seg_start, path in self.segments(start, end):
+            offset = 0
+            if start > seg_start:
+                index = self.load_index(path)
+                if index is not None:
+                    offset = index.offset_for(start)
+                    if offset < 0:
+                        continue
+            for _, record in iter_segment(path, offset, end):
+                if record['t'] >= start:
+                    yield record
+
+    def process_series(self, name: str, start: float, end: float) -> Iterator[dict]:
+        """流式返回某进程名的逐点数据，跳过索引显示不含该进程的分段"""
+        for seg_start, path in self.segments(start, end):
+            index = self.load_index(path)
+            offset = 0
+            if index is not None:
+                if name not in index.hour.names:
+                    continue
+                offset = index.offset_for(start) if start > seg_start else 0
+                if offset < 0:
+                    continue
+            for _, record in iter_segment(path, offset, end):
+                if record['t'] < start:
+                    continue
+                for row in record['p']:
+                    if row[1] == name:
+                        yield {'time': record['t'], 'pid': row[0], 'name': row[1], 'percent': row[2], 'mb': row[3],
+                               'majflt': row[4] if len(row) > 4 else None,
+                               'swap_mb': row[5] if len(row) > 5 else None}
+
+    def process_percentile(self, name: str, start: float, end: float, p: float) -> Optional[float]:
+        """与系统占比相同，用索引中该进程名的 MB 直方图计算，结果精度约 0.5%"""
+        summary = self.summarize(start, end)
+        b = _hist_percentile(summary.name_hist.get(name, {}), p)
+        return None if b is None else mb_bin_value(b)
+
+    def build_missing_indexes(self) -> int:
+        """为已结束但缺少索引的分段补建索引，返回补建数量"""
+        current = segment_name(time.time())
+        built = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.jsonl'))):
+            seg = os.path.basename(path)[:-len('.jsonl')]
+            if seg == current or self.load_index(path) is not None:
+                continue
+            SegmentIndex.build(path, segment_start(seg)).save(path[:-len('.jsonl')])
+            built += 1
+        return built
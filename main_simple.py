@@ -5,18 +5,30 @@ import json
 import os
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
     QHBoxLayout, QLabel, QListWidget, QListWidgetItem, QPushButton, QDialog,
-    QSpinBox, QFormLayout, QDialogButtonBox)
-from PySide6.QtCore import QTimer, Qt
+    QSpinBox, QFormLayout, QDialogButtonBox, QSystemTrayIcon, QMenu, QStyle, QAbstractItemView)
+from PySide6.QtCore import QTimer, Qt, QObject, Signal, QEvent
 from PySide6.QtGui import QFont
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from memory_monitor import MemoryMonitor
 from notifier import send_notification
+from profiler import Profiler
+from smaps import MemoryDrilldown
+from cgroup_monitor import CgroupMonitor, is_cgroup_v2
+from rules import RuleEngine, format_alerts
+from forensics import ForensicRecorder
+from history_store import HistoryRecorder
+from sparkline import PathCache, SparklineDelegate, OverlayChart
+from baseline import BaselineModel, SYSTEM_KEY
+from exporter import ColumnarExporter
+from config import PROFILE_OUTPUT, FORENSIC_DIR, HISTORY_DIR, BASELINE_FILE, EXPORT_DIR
 
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'user_config.json')
 
 def load_config():
-    default = {'threshold': 95, 'spike_threshold': 20, 'interval': 2000}
+    default = {'threshold': 95, 'spike_threshold': 20, 'interval': 2000, 'profile': False,
+               'view': 'process', 'background_interval': 10000, 'forensics': True,
+               'record_history': False, 'baseline': True, 'export': False}
     if os.path.exists(CONFIG_FILE):
         try:
             with open(CONFIG_FILE) as f:
@@ -57,19 +69,55 @@ class SettingsDialog(QDialog):
                 'spike_threshold': self.spike_spin.value()}
 
 
+def sample_percent(h):
+    """进程历史为 HistoryPoint，cgroup 历史为字典"""
+    return h['percent'] if isinstance(h, dict) else h.percent
+
+
+class DrilldownBridge(QObject):
+    """把后台线程的明细结果转发到界面线程"""
+    ready = Signal(object)
+
+
 class MemoryApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.config = load_config()
-        self.monitor = MemoryMonitor()
+        baseline = None
+        if self.config['baseline']:
+            baseline = BaselineModel(os.path.join(os.path.dirname(__file__), BASELINE_FILE))
+        self.monitor = MemoryMonitor(baseline=baseline, interval=self.config['interval'] / 1000)
+        self.profiler = Profiler(enabled=self.config['profile'])
+        self.drilldown = MemoryDrilldown()
+        self.drill_bridge = DrilldownBridge()
+        self.drill_bridge.ready.connect(self.on_breakdown)
+        self.cgroups = CgroupMonitor() if is_cgroup_v2() else None
         self.selected_pid = None
-        self.alert_cooldown = 0
+        self.selected_cgroup = None
+        self.overlay_keys = []
+        self.series_paths = PathCache(self.series_history, sample_percent)
+        self.rules = self.load_rules()
+        self.forensics = None
+        if self.config['forensics']:
+            self.forensics = ForensicRecorder(os.path.join(os.path.dirname(__file__), FORENSIC_DIR),
+                                              names=self.monitor.snapshot.names,
+                                              cgroup_path=self.monitor.cgroup_path)
+        self.history_recorder = None
+        if self.config['record_history']:
+            self.history_recorder = HistoryRecorder(os.path.join(os.path.dirname(__file__), HISTORY_DIR))
+        self.exporter = None
+        if self.config['export']:
+            self.exporter = ColumnarExporter(os.path.join(os.path.dirname(__file__), EXPORT_DIR),
+                                             names=self.monitor.snapshot.names)
+        self.background = False
+        self.last_rows = []
         self.init_ui()
+        self.init_tray()
         self.start_monitoring()
     
     def init_ui(self):
         self.setWindowTitle("内存监控")
-        self.setFixedSize(360, 420)
+        self.setFixedSize(360, 460)
         
         central = QWidget()
         self.setCentralWidget(central)
@@ -84,6 +132,14 @@ class MemoryApp(QMainWindow):
         top.addWidget(self.mem_label)
         top.addStretch()
         
+        if self.cgroups:
+            self.view_btn = QPushButton("cgroup")
+            self.view_btn.setCheckable(True)
+            self.view_btn.setChecked(self.config['view'] == 'cgroup')
+            self.view_btn.setFixedHeight(28)
+            self.view_btn.toggled.connect(self.toggle_view)
+            top.addWidget(self.view_btn)
+        
         settings_btn = QPushButton("⚙")
         settings_btn.setFixedSize(28, 28)
         settings_btn.clicked.connect(self.open_settings)
@@ -91,13 +147,15 @@ class MemoryApp(QMainWindow):
         layout.addLayout(top)
         
         # 进程列表
-        list_label = QLabel("进程列表 (点击查看走势)")
+        list_label = QLabel("进程列表 (点击查看走势，Ctrl 多选叠加对比)")
         list_label.setStyleSheet("color: #666; font-size: 11px;")
         layout.addWidget(list_label)
         
         self.proc_list = QListWidget()
         self.proc_list.setFixedHeight(140)
         self.proc_list.setStyleSheet("QListWidget { font-size: 12px; }")
+        self.proc_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.proc_list.setItemDelegate(SparklineDelegate(self.series_paths, parent=self.proc_list))
         self.proc_list.itemClicked.connect(self.on_item_click)
         layout.addWidget(self.proc_list)
         
@@ -106,11 +164,45 @@ class MemoryApp(QMainWindow):
         self.chart_label.setStyleSheet("color: #666; font-size: 11px;")
         layout.addWidget(self.chart_label)
         
+        # 选中进程的内存明细
+        self.detail_label = QLabel()
+        self.detail_label.setStyleSheet("color: #444; font-size: 10px;")
+        self.detail_label.setVisible(False)
+        layout.addWidget(self.detail_label)
+        
         self.fig = Figure(figsize=(3.4, 1.8), dpi=100)
         self.fig.subplots_adjust(left=0.12, right=0.95, top=0.9, bottom=0.15)
         self.ax = self.fig.add_subplot(111)
+        self.ax_mb = self.ax.twinx()
         self.canvas = FigureCanvas(self.fig)
         layout.addWidget(self.canvas)
+        
+        # 多选时的叠加走势图
+        self.overlay = OverlayChart(self.series_paths)
+        self.overlay.setFixedHeight(180)
+        self.overlay.setVisible(False)
+        layout.addWidget(self.overlay)
+        
+        # 性能剖析浮层
+        self.profile_label = QLabel(central)
+        self.profile_label.setStyleSheet(
+            "background: rgba(0, 0, 0, 160); color: #0f0; font-family: Menlo, monospace; font-size: 9px; padding: 2px;")
+        self.profile_label.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.profile_label.move(10, 40)
+        self.profile_label.setVisible(self.profiler.enabled)
+    
+    def init_tray(self):
+        self.tray = None
+        if not QSystemTrayIcon.isSystemTrayAvailable():
+            return
+        self.tray = QSystemTrayIcon(self.style().standardIcon(QStyle.SP_ComputerIcon), self)
+        menu = QMenu(self)
+        menu.addAction("显示窗口", self.restore_from_tray)
+        menu.addAction("退出", QApplication.instance().quit)
+        self.tray.setContextMenu(menu)
+        self.tray.activated.connect(self.on_tray_activated)
+        self.tray.show()
+        QApplication.instance().setQuitOnLastWindowClosed(False)
     
     def start_monitoring(self):
         self.timer = QTimer()
@@ -119,80 +211,343 @@ class MemoryApp(QMainWindow):
         self.update_data()
     
     def update_data(self):
-        mem_percent = self.monitor.get_system_memory()
-        processes = self.monitor.get_top_processes(10)
-        self.monitor.update_process_history(processes)
-        
-        # 更新状态
-        color = "red" if mem_percent >= self.config['threshold'] else "#333"
-        self.mem_label.setText(f"系统: {mem_percent:.1f}%")
-        self.mem_label.setStyleSheet(f"color: {color}; font-size: 13px; font-weight: bold;")
+        span = self.profiler.span
+        with span('system'):
+            mem_percent = self.monitor.get_system_memory()
+        with span('scan'):
+            processes = self.monitor.get_top_processes(10)
+        with span('paging'):
+            paging = self.monitor.collect_paging()
+        with span('history'):
+            self.monitor.update_process_history(processes)
+        cgroups = None
+        if self.cgroups:
+            # 无论列表显示哪种视图都采集 cgroup，保证 cgroup 规则和历史不中断
+            with span('cgroup'):
+                cgroups = self.cgroups.get_top_cgroups(10)
+        self.last_rows = cgroups if self.cgroup_view else processes
+        if self.history_recorder:
+            with span('record'):
+                self.history_recorder.record(mem_percent, self.monitor.snapshot.top(self.history_recorder.top),
+                                             paging=paging, rates=self.monitor.paging.system)
+        if self.exporter:
+            with span('export'):
+                self.exporter.write(mem_percent, self.monitor.snapshot, paging=paging,
+                                    rates=self.monitor.paging.system)
+        if self.forensics:
+            with span('forensics'):
+                self.forensics.record(mem_percent, self.monitor.snapshot)
+                oom = self.forensics.check_oom(self.cgroups)
+            if oom:
+                send_notification("OOM 报警", f"发生 OOM kill: {', '.join(oom)}")
         
         # 检测报警
-        if self.alert_cooldown > 0:
-            self.alert_cooldown -= 1
-        else:
-            self.check_alerts(mem_percent, processes)
+        self.check_alerts(mem_percent, processes, cgroups, paging)
+        # 先判断再学习，本次采集不影响自身的评估
+        if self.monitor.baseline:
+            with span('baseline'):
+                self.monitor.baseline.observe(mem_percent, self.monitor.snapshot.name_totals())
         
-        self.update_list(processes)
-        self.update_chart()
+        if self.tray:
+            self.tray.setToolTip(f"内存监控 - 系统: {mem_percent:.1f}%")
+        if not self.is_ui_visible():
+            self.enter_background()
+            return
+        if self.selected_pid:
+            # 每次采集只刷新 smaps_rollup，完整 smaps 映射列表按较长的 SMAPS_MAPPINGS_TTL 刷新
+            self.drilldown.request(self.selected_pid, self.drill_bridge.ready.emit)
+        if self.background:
+            # 切回其它桌面等情况下窗口重新可见时没有 showEvent，在此恢复前台(其中会刷新界面)
+            self.leave_background()
+        else:
+            self.render()
     
-    def check_alerts(self, mem_percent, processes):
-        alerts = []
-        if mem_percent >= self.config['threshold']:
-            alerts.append(f"系统内存 {mem_percent:.1f}%")
+    def render(self):
+        """根据已采集的最新数据和历史刷新界面"""
+        span = self.profiler.span
+        history = self.monitor.get_system_history()
+        if history:
+            mem_percent = history[-1]
+            color = "red" if mem_percent >= self.config['threshold'] else "#333"
+            self.mem_label.setText(f"系统: {mem_percent:.1f}%")
+            self.mem_label.setStyleSheet(f"color: {color}; font-size: 13px; font-weight: bold;")
         
-        spike_procs = self.monitor.detect_memory_spike(processes, self.config['spike_threshold'])
-        for p in spike_procs[:2]:
-            alerts.append(f"{p.name} 内存突变")
+        with span('list'):
+            self.update_list(self.last_rows)
+        with span('chart'):
+            self.update_chart()
+        
+        if self.profiler.enabled:
+            self.profiler.sample_self()
+            self.profile_label.setText(self.profiler.overlay_text())
+            self.profile_label.adjustSize()
+            self.profile_label.raise_()
+    
+    def is_ui_visible(self):
+        handle = self.windowHandle()
+        return (self.isVisible() and not self.isMinimized()
+                and (handle is None or handle.isExposed()))
+    
+    def enter_background(self):
+        """窗口不可见时只保留采集和报警，并降低采集频率"""
+        if self.background:
+            return
+        self.background = True
+        self.timer.setInterval(self.config['background_interval'])
+        self.monitor.interval = self.config['background_interval'] / 1000
+    
+    def leave_background(self):
+        """恢复前台：用已保存的历史一次性刷新界面"""
+        if not self.background:
+            return
+        self.background = False
+        self.timer.setInterval(self.config['interval'])
+        self.monitor.interval = self.config['interval'] / 1000
+        self.render()
+    
+    def on_tray_activated(self, reason):
+        if reason == QSystemTrayIcon.Trigger:
+            self.restore_from_tray()
+    
+    def restore_from_tray(self):
+        self.showNormal()
+        self.raise_()
+        self.activateWindow()
+    
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            if self.isMinimized():
+                self.enter_background()
+            else:
+                QTimer.singleShot(0, self.leave_background)
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        QTimer.singleShot(0, self.leave_background)
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.enter_background()
+    
+    def closeEvent(self, event):
+        # 有托盘时关闭窗口只隐藏到后台，通过托盘菜单退出
+        if self.tray:
+            event.ignore()
+            self.hide()
+        else:
+            super().closeEvent(event)
+    
+    @property
+    def cgroup_view(self):
+        return self.cgroups is not None and self.config['view'] == 'cgroup'
+    
+    def load_rules(self):
+        try:
+            rules = RuleEngine.from_config(self.config)
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"报警规则无效，使用默认规则: {e}", file=sys.stderr)
+            rules = RuleEngine.from_config({**self.config, 'rules': None})
+        if rules.cgroup_rules and self.cgroups is None and self.config.get('rules'):
+            print("当前系统不是 cgroup v2，cgroup 规则不会触发", file=sys.stderr)
+        return rules
+    
+    def check_alerts(self, mem_percent, processes, cgroups=None, paging=None):
+        # 规则针对完整快照评估；cgroup v2 主机上额外评估全部 cgroup，与进程分开
+        all_cgroups = self.cgroups.latest if cgroups is not None else None
+        changes = cgroup_changes = None
+        if self.rules.needs_spike:
+            with self.profiler.span('spike'):
+                # 只有进入过 TOP 列表的进程有历史，突变只对这些进程计算
+                changes = dict(zip((p.pid for p in processes), self.monitor.get_spike_changes(processes)))
+                if all_cgroups:
+                    cgroup_changes = dict(zip((c.path for c in all_cgroups),
+                                              self.cgroups.get_spike_changes(all_cgroups)))
+        with self.profiler.span('rules'):
+            system = self.monitor.paging.system
+            if self.monitor.baseline:
+                deviation = self.monitor.baseline.deviation(SYSTEM_KEY, mem_percent)
+                if deviation is not None:
+                    system = {**system, 'system_deviation': deviation}
+            alerts = self.rules.evaluate(mem_percent, self.monitor.snapshot, changes, paging=paging,
+                                         system=system, cgroups=all_cgroups, cgroup_spikes=cgroup_changes)
         
         if alerts:
-            send_notification("内存报警", " | ".join(alerts))
-            self.alert_cooldown = 15
+            message = format_alerts(alerts)
+            if self.forensics:
+                self.forensics.trigger(message)
+            with self.profiler.span('notify'):
+                send_notification("内存报警", message)
+    
+    def series_history(self, key):
+        """迷你图和叠加图的数据源：PID 对应进程历史，路径对应 cgroup 历史"""
+        if isinstance(key, str):
+            return self.cgroups.history.get(key) if self.cgroups else None
+        return self.monitor.process_history.get(key)
     
     def update_list(self, processes):
         current_row = self.proc_list.currentRow()
         self.proc_list.clear()
+        keys = []
         for p in processes:
             item = QListWidgetItem(f"{p.name:<20} {p.memory_percent:>5.1f}%")
-            item.setData(Qt.UserRole, p.pid)
+            key = p.path if self.cgroup_view else p.pid
+            keys.append(key)
+            item.setData(Qt.UserRole, key)
             self.proc_list.addItem(item)
         if current_row >= 0 and current_row < self.proc_list.count():
             self.proc_list.setCurrentRow(current_row)
+        for row, key in enumerate(keys):
+            if key in self.overlay_keys:
+                self.proc_list.item(row).setSelected(True)
+        self.series_paths.prune(keys + [k for _, k in self.overlay.series])
     
     def update_chart(self):
+        if self.overlay_keys:
+            # 叠加图只在有新样本的序列上重建路径
+            self.overlay.update()
+            return
         self.ax.clear()
+        self.ax_mb.clear()
+        self.ax_mb.set_visible(False)
         if self.selected_pid:
             history = self.monitor.get_process_history(self.selected_pid)
             if history:
                 self.ax.plot([h['percent'] for h in history], 'b-', lw=1.5)
+            details = self.drilldown.get_history(self.selected_pid)
+            if details:
+                self.ax_mb.set_visible(True)
+                self.ax_mb.plot([d.anon_mb for d in details], color='#e67e22', ls='--', lw=1)
+                self.ax_mb.plot([d.file_mb for d in details], color='#8e44ad', ls=':', lw=1)
+            swap = [h['swap_mb'] for h in history]
+            if any(swap):
+                self.ax_mb.set_visible(True)
+                self.ax_mb.plot(swap, color='#c0392b', ls='-.', lw=1)
+            if self.ax_mb.get_visible():
+                self.ax_mb.set_ylabel('MB', fontsize=8)
+                self.ax_mb.tick_params(labelsize=7)
+        elif self.selected_cgroup:
+            history = self.cgroups.get_history(self.selected_cgroup)
+            if history:
+                self.ax.plot([h['percent'] for h in history], 'b-', lw=1.5)
+                self.ax.axhline(y=self.config['threshold'], color='r', ls='--', lw=1)
         else:
             history = self.monitor.get_system_history()
             if history:
                 self.ax.plot(history, 'g-', lw=1.5)
                 self.ax.axhline(y=self.config['threshold'], color='r', ls='--', lw=1)
+            # 有换页或主缺页时在右轴叠加系统级速率
+            rates = self.monitor.paging.get_system_history()
+            if any(r['pgmajfault'] or r['pswpin'] or r['pswpout'] for r in rates):
+                self.ax_mb.set_visible(True)
+                self.ax_mb.plot([r['pgmajfault'] for r in rates], color='#e67e22', ls='--', lw=1)
+                self.ax_mb.plot([r['pswpin'] + r['pswpout'] for r in rates], color='#c0392b', ls=':', lw=1)
+                self.ax_mb.set_ylabel('页/秒', fontsize=8)
+                self.ax_mb.tick_params(labelsize=7)
         self.ax.set_ylabel('%', fontsize=9)
         self.ax.tick_params(labelsize=8)
         self.ax.grid(True, alpha=0.3)
         self.canvas.draw()
     
     def on_item_click(self, item):
-        self.selected_pid = item.data(Qt.UserRole)
+        selected = self.proc_list.selectedItems()
+        if len(selected) > 1:
+            self.show_overlay(selected)
+            return
+        self.hide_overlay()
         name = item.text().split()[0]
         self.chart_label.setText(f"{name} 内存走势")
+        if self.cgroup_view:
+            self.selected_cgroup = item.data(Qt.UserRole)
+            self.update_chart()
+            return
+        self.selected_pid = item.data(Qt.UserRole)
+        self.detail_label.setText("正在读取内存明细...")
+        self.detail_label.setVisible(True)
+        cached = self.drilldown.request(self.selected_pid, self.drill_bridge.ready.emit, full=True)
+        if cached:
+            self.show_breakdown(cached)
         self.update_chart()
     
+    def show_overlay(self, items):
+        """多选时用叠加图对比所选对象的走势"""
+        self.overlay_keys = [i.data(Qt.UserRole) for i in items]
+        threshold = self.config['threshold'] if self.cgroup_view else None
+        self.overlay.set_series([(i.text().split()[0], i.data(Qt.UserRole)) for i in items], threshold)
+        self.chart_label.setText(f"{len(items)} 个{'cgroup' if self.cgroup_view else '进程'}内存走势对比")
+        self.detail_label.setVisible(False)
+        self.selected_pid = None
+        self.selected_cgroup = None
+        self.canvas.setVisible(False)
+        self.overlay.setVisible(True)
+    
+    def hide_overlay(self):
+        if not self.overlay_keys:
+            return
+        self.overlay_keys = []
+        self.overlay.set_series([])
+        self.overlay.setVisible(False)
+        self.canvas.setVisible(True)
+    
+    def toggle_view(self, checked):
+        self.config['view'] = 'cgroup' if checked else 'process'
+        save_config(self.config)
+        self.hide_overlay()
+        self.selected_pid = None
+        self.selected_cgroup = None
+        self.detail_label.setVisible(False)
+        self.chart_label.setText("系统内存走势")
+        self.update_data()
+    
+    def on_breakdown(self, result):
+        if result.pid != self.selected_pid or self.background:
+            return
+        if result.error:
+            self.detail_label.setText(result.error)
+            return
+        self.show_breakdown(result)
+        if result.complete:
+            self.update_chart()
+    
+    def show_breakdown(self, b):
+        text = (f"匿名 {b.anon_mb:.0f}MB  文件 {b.file_mb:.0f}MB  "
+                f"共享 {b.shmem_mb:.0f}MB  交换 {b.swap_mb:.0f}MB")
+        pg = self.monitor.paging.get(b.pid)
+        if pg is not None:
+            text += f"\n缺页 主 {pg.majflt:.0f}/s  次 {pg.minflt:.0f}/s"
+        if b.mappings:
+            top = ", ".join(f"{os.path.basename(path) or path} {mb:.0f}MB" for mb, path in b.mappings[:3])
+            text += f"\n最大映射: {top}"
+        self.detail_label.setText(text)
+    
     def open_settings(self):
         dlg = SettingsDialog(self.config, self)
         if dlg.exec():
             vals = dlg.get_values()
             self.config.update(vals)
             save_config(self.config)
+            self.rules = self.load_rules()
+    
+    def on_quit(self):
+        self.monitor.close()
+        if self.forensics:
+            self.forensics.close()
+        if self.history_recorder:
+            self.history_recorder.close()
+        if self.monitor.baseline:
+            self.monitor.baseline.close()
+        if self.exporter:
+            self.exporter.close()
+        self.drilldown.shutdown()
+        if self.cgroups:
+            self.cgroups.close()
+        self.profiler.dump(os.path.join(os.path.dirname(__file__), PROFILE_OUTPUT))
 
 
 def main():
     app = QApplication(sys.argv)
     window = MemoryApp()
+    app.aboutToQuit.connect(window.on_quit)
     window.show()
     sys.exit(app.exec())
 
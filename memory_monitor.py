@@ -1,81 +1,344 @@
 #!/usr/bin/env python3
 """内存监控核心模块"""
+import heapq
+import os
+import time
+from array import array
+from itertools import islice
 import psutil
 from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Optional
-from config import HISTORY_LENGTH, SPIKE_CHECK_WINDOW, MEMORY_SPIKE_THRESHOLD
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from config import (HISTORY_LENGTH, SPIKE_CHECK_WINDOW, MEMORY_SPIKE_THRESHOLD, MONITOR_INTERVAL,
+                    SCAN_WORKERS, SCAN_MAX_WORKERS, SCAN_BUDGET_FRACTION, SCAN_TUNE_SAMPLES)
+from cgroup_monitor import own_cgroup_path, cgroup_usage
+from paging import PagingCollector, ProcessPaging
+from baseline import BaselineModel
+
+_MB = 1024 * 1024
+
 
 @dataclass
 class ProcessMemoryInfo:
+    __slots__ = ('pid', 'name', 'memory_percent', 'memory_mb')
     pid: int
     name: str
     memory_percent: float
     memory_mb: float
 
-class MemoryMonitor:
+
+class HistoryPoint(NamedTuple):
+    name: str
+    percent: float
+    mb: float
+    minflt: float = 0.0  # 次缺页/秒
+    majflt: float = 0.0  # 主缺页/秒
+    swap_mb: float = 0.0
+
+
+class NameTable:
+    """进程名驻留表：相同名称只保存一份字符串，快照中只存下标"""
+    __slots__ = ('names', 'index')
+
     def __init__(self):
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        idx = self.index.get(name)
+        if idx is None:
+            idx = self.index[name] = len(self.names)
+            self.names.append(name)
+        return idx
+
+
+class ProcessView:
+    """快照中一行的只读视图，属性与 ProcessMemoryInfo 相同"""
+    __slots__ = ('_snap', '_i')
+
+    def __init__(self, snap: 'ProcessSnapshot', i: int):
+        self._snap = snap
+        self._i = i
+
+    @property
+    def pid(self) -> int:
+        return self._snap.pids[self._i]
+
+    @property
+    def name(self) -> str:
+        return self._snap.names.names[self._snap.name_ids[self._i]]
+
+    @property
+    def memory_percent(self) -> float:
+        return self._snap.percents[self._i]
+
+    @property
+    def memory_mb(self) -> float:
+        return self._snap.mbs[self._i]
+
+    def to_info(self) -> ProcessMemoryInfo:
+        return ProcessMemoryInfo(self.pid, self.name, self.memory_percent, self.memory_mb)
+
+
+class ProcessSnapshot:
+    """结构数组形式的进程快照，每次扫描复用同一组数组"""
+    __slots__ = ('pids', 'percents', 'mbs', 'name_ids', 'names')
+
+    def __init__(self, names: NameTable = None):
+        self.pids = array('l')
+        self.percents = array('d')
+        self.mbs = array('d')
+        self.name_ids = array('l')
+        self.names = names or NameTable()
+
+    def clear(self):
+        # 切片删除保留数组已分配的容量
+        del self.pids[:], self.percents[:], self.mbs[:], self.name_ids[:]
+
+    def append(self, pid: int, name: str, percent: float, mb: float):
+        self.pids.append(pid)
+        self.percents.append(percent)
+        self.mbs.append(mb)
+        self.name_ids.append(self.names.intern(name))
+
+    def extend(self, other: 'ProcessSnapshot'):
+        self.pids.extend(other.pids)
+        self.percents.extend(other.percents)
+        self.mbs.extend(other.mbs)
+        names = other.names.names
+        self.name_ids.extend(self.names.intern(names[i]) for i in other.name_ids)
+
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    def __getitem__(self, i: int) -> ProcessView:
+        if not -len(self.pids) <= i < len(self.pids):
+            raise IndexError(i)
+        return ProcessView(self, i % len(self.pids))
+
+    def __iter__(self) -> Iterator[ProcessView]:
+        return (ProcessView(self, i) for i in range(len(self.pids)))
+
+    def top_indexes(self, limit: int) -> List[int]:
+        """占比最高的 limit 行的下标；占比相同时 PID 小的在前，与按 PID 顺序稳定排序一致"""
+        percents, pids = self.percents, self.pids
+        return heapq.nlargest(limit, range(len(pids)), key=lambda i: (percents[i], -pids[i]))
+    
+    def name_totals(self) -> Dict[str, float]:
+        """各进程名的占比合计，基线按进程名而非 PID 学习"""
+        by_id: Dict[int, float] = defaultdict(float)
+        for i, percent in zip(self.name_ids, self.percents):
+            by_id[i] += percent
+        names = self.names.names
+        return {names[i]: total for i, total in by_id.items()}
+    
+    def top(self, limit: int) -> List[ProcessMemoryInfo]:
+        """占比最高的 limit 个进程"""
+        return [ProcessView(self, i).to_info() for i in self.top_indexes(limit)]
+
+
+def _scan_into(snap: ProcessSnapshot, procs, total: int):
+    for proc in procs:
+        try:
+            rss = proc.memory_info().rss
+            percent = rss / total * 100
+            if percent > 0.1:
+                try:
+                    name = proc.name()
+                except psutil.AccessDenied:
+                    name = None
+                snap.append(proc.pid, name or 'Unknown', percent, rss / _MB)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+
+
+def scan_pids(pids: List[int], total: int, procs: Dict[int, psutil.Process] = None) -> ProcessSnapshot:
+    """扫描一组 PID 返回快照(可在子进程中调用)；procs 用于跨周期复用 Process 对象"""
+    def iter_procs():
+        for pid in pids:
+            try:
+                proc = procs.get(pid) if procs is not None else None
+                if proc is None or not proc.is_running():
+                    proc = psutil.Process(pid)
+                    if procs is not None:
+                        procs[pid] = proc
+                yield proc
+            except psutil.NoSuchProcess:
+                continue
+
+    snap = ProcessSnapshot()
+    _scan_into(snap, iter_procs(), total)
+    return snap
+
+
+class MemoryMonitor:
+    def __init__(self, scan_workers: int = SCAN_WORKERS, use_processes: bool = False,
+                 baseline: BaselineModel = None, interval: float = MONITOR_INTERVAL / 1000):
         self.process_history: Dict[int, deque] = defaultdict(
             lambda: deque(maxlen=HISTORY_LENGTH)
         )
         self.system_history: deque = deque(maxlen=HISTORY_LENGTH)
+        self.cgroup_path = own_cgroup_path()
+        # 最近一次扫描的全部进程(占比 > 0.1%)
+        self.snapshot = ProcessSnapshot()
+        self.ticks = 0
+        self._last_seen: Dict[int, int] = {}
+        # scan_workers 为 0 时根据实测扫描耗时自动调整
+        self.auto_workers = scan_workers == 0
+        self.workers = max(1, scan_workers)
+        self.use_processes = use_processes
+        self.scan_time = 0.0  # 扫描耗时的滑动平均(秒)
+        self.interval = interval  # 当前采集间隔(秒)，扫描预算按其比例计算
+        self._worker_limit = SCAN_MAX_WORKERS  # 实测更多线程没有变快时的上限
+        self._previous: Optional[Tuple[int, float]] = None  # 加倍前的 (线程数, 扫描耗时)
+        self._samples = 0  # 调整线程数后的采集次数
+        self._pool = None
+        self._pool_size = 0
+        self._procs: Dict[int, psutil.Process] = {}
+        self.paging = PagingCollector()
+        # 设置后突变按进程名在当前时段的基线判断
+        self.baseline = baseline
     
     def get_system_memory(self) -> float:
-        """获取系统内存使用百分比"""
+        """获取系统内存使用百分比，运行在有内存限额的容器中时按限额计算"""
         mem = psutil.virtual_memory()
         percent = mem.percent
+        if self.cgroup_path:
+            usage = cgroup_usage(self.cgroup_path)
+            if usage and usage[1] < mem.total:
+                percent = usage[0] / usage[1] * 100
         self.system_history.append(percent)
         return percent
     
-    def get_top_processes(self, limit: int = 10) -> List[ProcessMemoryInfo]:
-        """获取内存占用最高的进程"""
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'memory_percent', 'memory_info']):
-            try:
-                info = proc.info
-                if info['memory_percent'] and info['memory_percent'] > 0.1:
-                    memory_mb = info['memory_info'].rss / (1024 * 1024) if info['memory_info'] else 0
-                    processes.append(ProcessMemoryInfo(
-                        pid=info['pid'],
-                        name=info['name'] or 'Unknown',
-                        memory_percent=info['memory_percent'],
-                        memory_mb=memory_mb
-                    ))
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        
-        processes.sort(key=lambda x: x.memory_percent, reverse=True)
-        return processes[:limit]
+    def get_top_processes(self, limit: int = 10, workers: int = None) -> List[ProcessMemoryInfo]:
+        """获取内存占用最高的进程，workers > 1 时分片并行扫描"""
+        workers = workers or self.workers
+        start = time.perf_counter()
+        total = psutil.virtual_memory().total
+        self.snapshot.clear()
+        if workers > 1:
+            self._scan_parallel(workers, total)
+        else:
+            _scan_into(self.snapshot, psutil.process_iter(), total)
+        processes = self.snapshot.top(limit)
+        elapsed = time.perf_counter() - start
+        self.scan_time = elapsed if not self.scan_time else 0.8 * self.scan_time + 0.2 * elapsed
+        if self.auto_workers:
+            self._tune_workers()
+        return processes
+    
+    def _scan_parallel(self, workers: int, total: int):
+        pids = psutil.pids()
+        if self._pool is None or self._pool_size != workers:
+            self.close()
+            pool_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._pool = pool_cls(max_workers=workers)
+            self._pool_size = workers
+        # 线程模式下共享 Process 对象缓存；进程池无法共享，每次重新创建
+        procs = None if self.use_processes else self._procs
+        shards = [pids[i::workers] for i in range(workers)]
+        futures = [self._pool.submit(scan_pids, shard, total, procs) for shard in shards]
+        for f in futures:
+            self.snapshot.extend(f.result())
+        if procs is not None:
+            alive = set(pids)
+            for pid in [pid for pid in procs if pid not in alive]:
+                del procs[pid]
+    
+    def _tune_workers(self):
+        """扫描超出预算时加倍工作线程，远低于预算时减半；加倍后没有变快则退回"""
+        self._samples += 1
+        if self._samples < SCAN_TUNE_SAMPLES:
+            return
+        if self._previous is not None:
+            workers, scan_time = self._previous
+            self._previous = None
+            if self.scan_time >= scan_time:
+                # 受 GIL 等限制，更多线程反而更慢，退回并不再尝试更多线程
+                self._worker_limit = workers
+                self._set_workers(workers, scan_time)
+                return
+        budget = self.interval * SCAN_BUDGET_FRACTION
+        max_workers = min(self._worker_limit, os.cpu_count() or 1)
+        if self.scan_time > budget and self.workers < max_workers:
+            self._previous = (self.workers, self.scan_time)
+            self._set_workers(min(max_workers, self.workers * 2), 0.0)
+        elif self.scan_time < budget / 4 and self.workers > 1:
+            # 负载下降后允许以后重新尝试更多线程
+            self._worker_limit = SCAN_MAX_WORKERS
+            self._set_workers(self.workers // 2, 0.0)
+    
+    def _set_workers(self, workers: int, scan_time: float):
+        self.workers = workers
+        self.scan_time = scan_time
+        self._samples = 0
+    
+    def collect_paging(self) -> Dict[int, ProcessPaging]:
+        """读取最近一次扫描中占用最高进程的缺页和交换指标，以及系统级换页速率"""
+        pids = self.snapshot.pids
+        return self.paging.collect([pids[i] for i in self.snapshot.top_indexes(self.paging.limit)])
+    
+    def close(self):
+        """关闭并行扫描的工作池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            self._pool_size = 0
     
     def update_process_history(self, processes: List[ProcessMemoryInfo]):
-        """更新进程内存历史记录"""
+        """更新进程内存历史记录(含本次采集到的缺页和交换指标)，清理长时间未出现的进程"""
+        self.ticks += 1
+        paging = self.paging.latest
+        for proc in processes:
+            pg = paging.get(proc.pid)
+            if pg is None:
+                point = HistoryPoint(proc.name, proc.memory_percent, proc.memory_mb)
+            else:
+                point = HistoryPoint(proc.name, proc.memory_percent, proc.memory_mb, *pg)
+            self.process_history[proc.pid].append(point)
+            self._last_seen[proc.pid] = self.ticks
+        if self.ticks % HISTORY_LENGTH == 0:
+            expired = [pid for pid, seen in self._last_seen.items() if self.ticks - seen > HISTORY_LENGTH]
+            for pid in expired:
+                del self._last_seen[pid]
+                self.process_history.pop(pid, None)
+    
+    def get_spike_changes(self, processes: List[ProcessMemoryInfo], now: float = None) -> List[float]:
+        """计算每个进程的变化百分比：有成熟基线时相对当前时段的基线，否则相对突变窗口均值，历史不足时为 0"""
+        changes = []
+        totals = None
+        if self.baseline is not None:
+            # 与 observe 使用同一口径：完整快照中同名进程的合计
+            totals = self.snapshot.name_totals()
+            now = now or time.time()
         for proc in processes:
-            self.process_history[proc.pid].append({
-                'name': proc.name,
-                'percent': proc.memory_percent,
-                'mb': proc.memory_mb
-            })
+            if totals is not None:
+                deviation = self.baseline.deviation(proc.name, totals.get(proc.name, proc.memory_percent), now)
+                if deviation is not None:
+                    changes.append(deviation)
+                    continue
+            change_percent = 0.0
+            history = self.process_history.get(proc.pid)
+            if history and len(history) >= SPIKE_CHECK_WINDOW > 1:
+                n = len(history)
+                old_values = islice(history, n - SPIKE_CHECK_WINDOW, n - 1)
+                avg_old = sum(h.percent for h in old_values) / (SPIKE_CHECK_WINDOW - 1)
+                if avg_old > 0:
+                    change_percent = ((proc.memory_percent - avg_old) / avg_old) * 100
+            changes.append(change_percent)
+        return changes
     
     def detect_memory_spike(self, processes: List[ProcessMemoryInfo], spike_threshold: float = None) -> List[ProcessMemoryInfo]:
         """检测内存突变的进程"""
         if spike_threshold is None:
             spike_threshold = MEMORY_SPIKE_THRESHOLD
-        spike_processes = []
-        for proc in processes:
-            history = self.process_history.get(proc.pid)
-            if history and len(history) >= SPIKE_CHECK_WINDOW:
-                old_values = list(history)[-SPIKE_CHECK_WINDOW:-1]
-                if old_values:
-                    avg_old = sum(h['percent'] for h in old_values) / len(old_values)
-                    if avg_old > 0:
-                        change_percent = ((proc.memory_percent - avg_old) / avg_old) * 100
-                        if change_percent > spike_threshold:
-                            spike_processes.append(proc)
-        return spike_processes
+        changes = self.get_spike_changes(processes)
+        return [proc for proc, change in zip(processes, changes) if change > spike_threshold]
     
     def get_process_history(self, pid: int) -> List[dict]:
         """获取指定进程的内存历史"""
-        return list(self.process_history.get(pid, []))
+        return [h._asdict() for h in self.process_history.get(pid, [])]
     
     def get_system_history(self) -> List[float]:
         """获取系统内存历史"""
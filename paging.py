@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""缺页、交换与内存回收指标：进程级主/次缺页速率和交换占用，系统级 /proc/vmstat 速率"""
+import sys
+import time
+from array import array
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import psutil
+from config import HISTORY_LENGTH, PAGING_BUDGET_MS, PAGING_MAX_PROCESSES
+
+PROC_ROOT = '/proc'
+# 系统级速率指标 -> 对应的 /proc/vmstat 计数器前缀(同前缀的 kswapd/direct/khugepaged 计数相加)
+VMSTAT_METRICS = {
+    'pgmajfault': ('pgmajfault',),
+    'pswpin': ('pswpin',),
+    'pswpout': ('pswpout',),
+    'pgscan': ('pgscan_kswapd', 'pgscan_direct', 'pgscan_khugepaged'),
+    'pgsteal': ('pgsteal_kswapd', 'pgsteal_direct', 'pgsteal_khugepaged'),
+}
+_VMSTAT_KEYS = {key: metric for metric, keys in VMSTAT_METRICS.items() for key in keys}
+_HAS_PROC = sys.platform.startswith('linux')
+
+
+class ProcessPaging(NamedTuple):
+    minflt: float  # 次缺页/秒
+    majflt: float  # 主缺页/秒
+    swap_mb: float
+
+
+def read_vmstat(path: str = f"{PROC_ROOT}/vmstat") -> Optional[Dict[str, int]]:
+    """读取并合并 VMSTAT_METRICS 中的计数器，不可用时返回 None"""
+    counters = dict.fromkeys(VMSTAT_METRICS, 0)
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(' ')
+                metric = _VMSTAT_KEYS.get(key)
+                if metric is not None:
+                    counters[metric] += int(value)
+    except (OSError, ValueError):
+        return None
+    return counters
+
+
+def read_proc_paging(pid: int, proc_root: str = PROC_ROOT) -> Optional[Tuple[int, int, float]]:
+    """读取进程累计 (次缺页, 主缺页, 交换MB)，进程已退出或无权限时返回 None"""
+    if not _HAS_PROC:
+        return _psutil_paging(pid)
+    try:
+        with open(f"{proc_root}/{pid}/stat", 'rb') as f:
+            stat = f.read()
+        # 进程名可能含空格和括号，从最后一个 ')' 之后按字段切分：minflt 为第 10 项，majflt 为第 12 项
+        fields = stat[stat.rindex(b')') + 2:].split()
+        minflt, majflt = int(fields[7]), int(fields[9])
+        swap_kb = 0
+        with open(f"{proc_root}/{pid}/status", 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmSwap:'):
+                    swap_kb = int(line.split()[1])
+                    break
+        return minflt, majflt, swap_kb / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _psutil_paging(pid: int) -> Optional[Tuple[int, int, float]]:
+    """无 /proc 时(如 macOS)用 pfaults/pageins 近似次/主缺页，交换占用不可得"""
+    try:
+        info = psutil.Process(pid).memory_info()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+    if not hasattr(info, 'pfaults'):
+        return None
+    return info.pfaults, info.pageins, 0.0
+
+
+class PagingCollector:
+    """每次采集读取占用最高的若干进程和系统计数器，换算为相对上次的速率
+
+    进程覆盖数量根据实测耗时自动调整，使每次采集的额外开销保持在预算内。
+    """
+
+    def __init__(self, budget_ms: float = PAGING_BUDGET_MS, max_processes: int = PAGING_MAX_PROCESSES):
+        self.budget = budget_ms / 1000
+        self.max_processes = max_processes
+        self.limit = max_processes
+        self.cost = 0.0  # 每次采集耗时的滑动平均(秒)
+        self.latest: Dict[int, ProcessPaging] = {}
+        self.system: Dict[str, float] = dict.fromkeys(VMSTAT_METRICS, 0.0)
+        self.system_history: deque = deque(maxlen=HISTORY_LENGTH)
+        self._prev: Dict[int, Tuple[float, int, int]] = {}  # pid -> (时间, 次缺页, 主缺页)
+        self._prev_system: Optional[Tuple[float, Dict[str, int]]] = None
+        # 本次采集的原始计数，按数组复用
+        self._pids = array('l')
+        self._minflt = array('q')
+        self._majflt = array('q')
+        self._swap = array('d')
+
+    def collect(self, pids: List[int], now: float = None) -> Dict[int, ProcessPaging]:
+        """采集 pids 中前 limit 个进程和系统计数器，返回 pid -> ProcessPaging"""
+        if now is None:
+            now = time.monotonic()
+        start = time.perf_counter()
+        self._collect_system(now)
+
+        pids_arr, minflt, majflt, swap = self._pids, self._minflt, self._majflt, self._swap
+        del pids_arr[:], minflt[:], majflt[:], swap[:]
+        for pid in pids[:self.limit]:
+            raw = read_proc_paging(pid)
+            if raw is not None:
+                pids_arr.append(pid)
+                minflt.append(raw[0])
+                majflt.append(raw[1])
+                swap.append(raw[2])
+
+        # 一次遍历数组计算速率；首次出现的进程没有上次计数，速率记为 0
+        prev, latest, current = self._prev, {}, {}
+        for pid, mi, ma, sw in zip(pids_arr, minflt, majflt, swap):
+            last = prev.get(pid)
+            if last is not None and now > last[0]:
+                dt = now - last[0]
+                latest[pid] = ProcessPaging(max(0, mi - last[1]) / dt, max(0, ma - last[2]) / dt, sw)
+            else:
+                latest[pid] = ProcessPaging(0.0, 0.0, sw)
+            current[pid] = (now, mi, ma)
+        self._prev = current
+        self.latest = latest
+
+        elapsed = time.perf_counter() - start
+        self.cost = elapsed if not self.cost else 0.8 * self.cost + 0.2 * elapsed
+        self._tune()
+        return latest
+
+    def _collect_system(self, now: float):
+        counters = read_vmstat()
+        if counters is None:
+            return
+        if self._prev_system is not None and now > self._prev_system[0]:
+            t, prev = self._prev_system
+            self.system = {k: max(0, counters[k] - prev[k]) / (now - t) for k in counters}
+        self._prev_system = (now, counters)
+        self.system_history.append(self.system)
+
+    def _tune(self):
+        """超出预算时减半覆盖的进程数，远低于预算时加倍"""
+        if self.cost > self.budget and self.limit > 1:
+            self.limit //= 2
+            self.cost = 0.0
+        elif self.cost < self.budget / 4 and self.limit < self.max_processes:
+            self.limit = min(self.max_processes, self.limit * 2)
+            self.cost = 0.0
+
+    def get(self, pid: int) -> Optional[ProcessPaging]:
+        return self.latest.get(pid)
+
+    def get_system_history(self) -> List[Dict[str, float]]:
+        return list(self.system_history)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""自监控性能剖析模块"""
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Dict, List
+import psutil
+from config import PROFILE_BUDGET_RSS_MB, PROFILE_BUDGET_CPU_PERCENT
+
+# 直方图桶边界(微秒)：1us ~ 约 17s，每桶放大 2^(1/4) 倍，桶数固定
+_BUCKET_BOUNDS = [2 ** (i / 4) for i in range(97)]
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    """固定大小的对数直方图，记录耗时分布"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, us: float):
+        self.counts[bisect_left(_BUCKET_BOUNDS, us)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, p: float) -> float:
+        """返回第 p 百分位耗时(微秒)，取所在桶的上界且不超过最大值"""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                return min(_BUCKET_BOUNDS[i], self.max) if i < len(_BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count if self.count else 0.0,
+            'p50_us': self.percentile(50),
+            'p95_us': self.percentile(95),
+            'p99_us': self.percentile(99),
+            'max_us': self.max,
+        }
+
+
+class _Span:
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, hist: Histogram):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.add((time.perf_counter() - self.start) * 1e6)
+        return False
+
+
+class Profiler:
+    """按阶段统计耗时，并记录自身 RSS 和 CPU"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.phases: Dict[str, Histogram] = {}
+        self.process = psutil.Process()
+        self.rss_mb = 0.0
+        self.peak_rss_mb = 0.0
+        self.cpu_percent = 0.0
+        self.peak_cpu_percent = 0.0
+        self._start = (time.monotonic(), sum(self.process.cpu_times()[:2]))
+        if enabled:
+            self.process.cpu_percent()
+
+    def span(self, phase: str):
+        """返回计时上下文，未启用时返回共享的空上下文"""
+        if not self.enabled:
+            return _NULL_SPAN
+        hist = self.phases.get(phase)
+        if hist is None:
+            hist = self.phases[phase] = Histogram()
+        return _Span(hist)
+
+    def sample_self(self):
+        """采样自身内存和CPU占用"""
+        if not self.enabled:
+            return
+        self.rss_mb = self.process.memory_info().rss / (1024 * 1024)
+        self.cpu_percent = self.process.cpu_percent()
+        self.peak_rss_mb = max(self.peak_rss_mb, self.rss_mb)
+        self.peak_cpu_percent = max(self.peak_cpu_percent, self.cpu_percent)
+
+    def avg_cpu_percent(self) -> float:
+        """启动以来的平均CPU占用"""
+        wall = time.monotonic() - self._start[0]
+        cpu = sum(self.process.cpu_times()[:2]) - self._start[1]
+        return cpu / wall * 100 if wall > 0 else 0.0
+
+    def report(self) -> dict:
+        return {
+            'phases': {name: h.summary() for name, h in self.phases.items()},
+            'self': {
+                'rss_mb': self.rss_mb,
+                'peak_rss_mb': self.peak_rss_mb,
+                'cpu_percent': self.cpu_percent,
+                'peak_cpu_percent': self.peak_cpu_percent,
+                'avg_cpu_percent': self.avg_cpu_percent(),
+            },
+        }
+
+    def overlay_text(self) -> str:
+        """调试浮层显示的文本"""
+        lines = [f"{name:<8} p50 {h.percentile(50) / 1000:6.2f} "
+                 f"p95 {h.percentile(95) / 1000:6.2f} p99 {h.percentile(99) / 1000:6.2f} ms"
+                 for name, h in self.phases.items()]
+        lines.append(f"self     {self.rss_mb:.1f} MB  CPU {self.cpu_percent:.1f}%")
+        return "\n".join(lines)
+
+    def check_budget(self, rss_mb: float = None, cpu_percent: float = None) -> List[str]:
+        """检查峰值内存和平均CPU是否超出预算，返回超限说明"""
+        if rss_mb is None:
+            rss_mb = PROFILE_BUDGET_RSS_MB
+        if cpu_percent is None:
+            cpu_percent = PROFILE_BUDGET_CPU_PERCENT
+        violations = []
+        if self.peak_rss_mb > rss_mb:
+            violations.append(f"RSS {self.peak_rss_mb:.1f} MB > {rss_mb} MB")
+        avg_cpu = self.avg_cpu_percent()
+        if avg_cpu > cpu_percent:
+            violations.append(f"CPU {avg_cpu:.1f}% > {cpu_percent}%")
+        return violations
+
+    def dump(self, path: str):
+        """导出剖析结果为 JSON"""
+        if not self.enabled:
+            return
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(tmp, path)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""声明式报警规则引擎
+
+规则在 user_config.json 的 "rules" 中定义，例如:
+    {"name": "Chrome 占用过大", "metric": "mb", "scope": {"group": "*Chrome*"},
+     "op": ">", "value": 4096, "for": "30s", "clear": 3500, "cooldown": "5m",
+     "severity": "warning"}
+
+metric: 系统级 system_percent | pgmajfault | pswpin | pswpout | pgscan | pgsteal (每秒速率)
+        | system_deviation (相对分时段基线的变化%)
+        进程级 percent | mb | spike | minflt | majflt (每秒缺页数) | swap_mb
+        cgroup 级 percent | mb | spike
+scope:  "system" | "process" | {"name": 通配符} (逐个进程) | {"group": 通配符} (合计)
+        | "cgroup" | {"cgroup": 路径通配符} (逐个 cgroup，与进程分开计算和保存状态)
+"""
+import fnmatch
+import operator
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from config import PAGING_MAJFLT_THRESHOLD
+
+_OPS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+_SYSTEM_METRICS = ('system_percent', 'pgmajfault', 'pswpin', 'pswpout', 'pgscan', 'pgsteal', 'system_deviation')
+_PAGING_METRICS = ('minflt', 'majflt', 'swap_mb')
+_METRICS = _SYSTEM_METRICS + ('percent', 'mb', 'spike') + _PAGING_METRICS
+_CGROUP_METRICS = ('percent', 'mb', 'spike')
+_NAME_CACHE_LIMIT = 4096
+
+
+def parse_duration(value) -> float:
+    """解析 "30s" / "5m" / "1h" 或数字(秒)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip().lower()
+    if value.startswith('for '):
+        value = value[4:].strip()
+    if value and value[-1] in _UNITS:
+        return float(value[:-1]) * _UNITS[value[-1]]
+    return float(value)
+
+
+@dataclass
+class Alert:
+    rule: str
+    severity: str
+    target: str  # 触发对象：system、进程名或分组通配符
+    value: float
+    metric: str = 'system_percent'
+
+
+class Rule:
+    """编译后的规则，保存逐对象的触发状态"""
+
+    def __init__(self, spec: dict):
+        self.name = spec.get('name') or f"{spec['metric']} {spec['op']} {spec['value']}"
+        self.metric = spec['metric']
+        if self.metric not in _METRICS:
+            raise ValueError(f"未知指标: {self.metric}")
+        self.op = _OPS[spec['op']]
+        self.value = float(spec['value'])
+        # 滞回：触发后需越过 clear 才解除，默认与阈值相同
+        self.clear = float(spec.get('clear', self.value))
+        self.duration = parse_duration(spec.get('for', 0))
+        self.cooldown = parse_duration(spec.get('cooldown', 30))
+        self.severity = spec.get('severity', 'warning')
+
+        is_system = self.metric in _SYSTEM_METRICS
+        scope = spec.get('scope', 'system' if is_system else 'process')
+        self.pattern: Optional[re.Pattern] = None
+        if isinstance(scope, dict):
+            self.scope = 'group' if 'group' in scope else 'cgroup' if 'cgroup' in scope else 'process'
+            label = scope.get('group') or scope.get('cgroup') or scope['name']
+            self.pattern = re.compile(fnmatch.translate(label))
+            self.label = label
+        else:
+            self.scope = scope
+            self.label = scope
+        if (self.scope == 'system') != is_system:
+            raise ValueError(f"规则 {self.name}: 指标 {self.metric} 不适用于范围 {self.scope}")
+        if self.scope == 'cgroup' and self.metric not in _CGROUP_METRICS:
+            raise ValueError(f"规则 {self.name}: 指标 {self.metric} 不适用于 cgroup")
+
+        self.pending: Dict[str, float] = {}  # 对象 -> 条件首次满足时间
+        self.firing: Dict[str, float] = {}  # 对象 -> 上次通知时间
+
+    def match(self, name: str) -> bool:
+        return self.pattern is None or self.pattern.match(name) is not None
+
+    def step(self, values: Dict[str, float], now: float) -> List[Alert]:
+        """用本次快照中各对象的值推进状态机"""
+        alerts = []
+        for key in [k for k in self.pending if k not in values]:
+            del self.pending[key]
+        for key in [k for k in self.firing if k not in values]:
+            del self.firing[key]
+        op, threshold, clear = self.op, self.value, self.clear
+        for key, v in values.items():
+            if key in self.firing:
+                if not op(v, clear):
+                    del self.firing[key]
+                    self.pending.pop(key, None)
+                elif now - self.firing[key] >= self.cooldown:
+                    self.firing[key] = now
+                    alerts.append(Alert(self.name, self.severity, key, v, self.metric))
+            elif op(v, threshold):
+                since = self.pending.setdefault(key, now)
+                if now - since >= self.duration:
+                    self.firing[key] = now
+                    alerts.append(Alert(self.name, self.severity, key, v, self.metric))
+            else:
+                self.pending.pop(key, None)
+        return alerts
+
+
+class RuleEngine:
+    """单次遍历快照，把每行的值分发给匹配的规则，再推进各规则状态"""
+
+    def __init__(self, specs: List[dict]):
+        self.rules = [Rule(spec) for spec in specs]
+        self.needs_spike = any(r.metric == 'spike' for r in self.rules)
+        self.system_rules = [r for r in self.rules if r.scope == 'system']
+        self.row_rules = [r for r in self.rules if r.scope not in ('system', 'cgroup')]
+        self.cgroup_rules = [r for r in self.rules if r.scope == 'cgroup']
+        self._targets: Dict[str, Tuple[Rule, ...]] = {}  # 进程名 -> 匹配的规则
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'RuleEngine':
+        """读取配置中的 rules；未配置时使用与原有阈值等价的默认规则"""
+        specs = config.get('rules')
+        if not specs:
+            cooldown = 15 * config['interval'] / 1000
+            specs = [
+                {'name': '系统内存', 'metric': 'system_percent', 'op': '>=',
+                 'value': config['threshold'], 'cooldown': cooldown, 'severity': 'critical'},
+                {'name': '内存突变', 'metric': 'spike', 'scope': 'process', 'op': '>',
+                 'value': config['spike_threshold'], 'cooldown': cooldown},
+                {'name': '内存突变', 'metric': 'spike', 'scope': 'cgroup', 'op': '>',
+                 'value': config['spike_threshold'], 'cooldown': cooldown},
+                {'name': '主缺页频繁', 'metric': 'majflt', 'scope': 'process', 'op': '>',
+                 'value': config.get('majflt_threshold', PAGING_MAJFLT_THRESHOLD), 'for': '10s',
+                 'cooldown': cooldown},
+            ]
+        return cls(specs)
+
+    def _rules_for(self, name: str) -> Tuple[Rule, ...]:
+        targets = self._targets.get(name)
+        if targets is None:
+            if len(self._targets) >= _NAME_CACHE_LIMIT:
+                self._targets.clear()
+            targets = self._targets[name] = tuple(r for r in self.row_rules if r.match(name))
+        return targets
+
+    def evaluate(self, mem_percent: float, processes, spike_changes: Dict[int, float] = None,
+                 now: float = None, paging: dict = None, system: Dict[str, float] = None,
+                 cgroups: list = None, cgroup_spikes: Dict[str, float] = None) -> List[Alert]:
+        """processes 为完整快照；spike_changes 为 pid -> 变化%，只包含有历史的进程；
+        paging 为 pid -> ProcessPaging，system 为系统级速率；cgroups 单独按路径评估。
+        缺少某项指标的对象不参与对应规则"""
+        if now is None:
+            now = time.monotonic()
+        spike_changes = spike_changes or {}
+        paging = paging or {}
+
+        values: Dict[Rule, Dict[str, float]] = {r: {r.label: 0.0} for r in self.row_rules if r.scope == 'group'}
+        for p in processes:
+            targets = self._rules_for(p.name)
+            if not targets:
+                continue
+            pid = p.pid
+            row = {'percent': p.memory_percent, 'mb': p.memory_mb}
+            spike = spike_changes.get(pid)
+            if spike is not None:
+                row['spike'] = spike
+            pg = paging.get(pid)
+            if pg is not None:
+                row['minflt'], row['majflt'], row['swap_mb'] = pg
+            for rule in targets:
+                v = row.get(rule.metric)
+                if v is None:
+                    continue
+                if rule.scope == 'group':
+                    values[rule][rule.label] += v
+                else:
+                    # 同名进程取最大值，以进程名作为状态键
+                    bucket = values.setdefault(rule, {})
+                    if v > bucket.get(p.name, float('-inf')):
+                        bucket[p.name] = v
+
+        cgroup_spikes = cgroup_spikes or {}
+        for cg in cgroups or ():
+            row = {'percent': cg.memory_percent, 'mb': cg.memory_mb}
+            spike = cgroup_spikes.get(cg.path)
+            if spike is not None:
+                row['spike'] = spike
+            for rule in self.cgroup_rules:
+                v = row.get(rule.metric)
+                if v is not None and rule.match(cg.path):
+                    # 以路径作为状态键，不与同名进程共用状态
+                    values.setdefault(rule, {})[cg.path] = v
+
+        alerts = []
+        system_values = {**(system or {}), 'system_percent': mem_percent}
+        for rule in self.system_rules:
+            v = system_values.get(rule.metric)
+            alerts.extend(rule.step({} if v is None else {'system': v}, now))
+        for rule in self.row_rules + self.cgroup_rules:
+            rule_values = values.get(rule)
+            if rule_values or rule.pending or rule.firing:
+                alerts.extend(rule.step(rule_values or {}, now))
+        return alerts
+
+
+def format_alerts(alerts: List[Alert], limit: int = 3) -> str:
+    """把报警合并成一条通知文本，严重级别高的在前"""
+    order = {'critical': 0, 'warning': 1}
+    alerts = sorted(alerts, key=lambda a: order.get(a.severity, 2))
+    parts = []
+    for a in alerts[:limit]:
+        if a.target == 'system':
+            unit = '%' if a.metric in ('system_percent', 'system_deviation') else '/s'
+            parts.append(f"{a.rule} {a.value:.1f}{unit}")
+        else:
+            parts.append(f"{a.target} {a.rule}")
+    if len(alerts) > limit:
+        parts.append(f"等 {len(alerts)} 项")
+    return " | ".join(parts)
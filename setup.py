@@ -4,7 +4,7 @@ py2app 打包配置
 from setuptools import setup
 
 APP = ['main_simple.py']
-DATA_FILES = ['config.py', 'memory_monitor.py', 'notifier.py']
+DATA_FILES = ['config.py', 'memory_monitor.py', 'notifier.py', 'profiler.py', 'smaps.py', 'cgroup_monitor.py', 'rules.py', 'async_monitor.py', 'forensics.py', 'history_store.py', 'paging.py', 'baseline.py', 'exporter.py', 'sparkline.py']
 
 OPTIONS = {
     'argv_emulation': False,
@@ -18,7 +18,7 @@ OPTIONS = {
         'NSHighResolutionCapable': True,
     },
     'packages': ['PySide6', 'psutil', 'matplotlib'],
-    'includes': ['memory_monitor', 'notifier', 'config'],
+    'includes': ['memory_monitor', 'notifier', 'config', 'profiler', 'smaps', 'cgroup_monitor', 'rules', 'async_monitor', 'forensics', 'history_store', 'paging', 'baseline', 'exporter', 'sparkline'],
 }
 
 setup(
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""进程内存明细模块：解析 /proc/<pid>/smaps_rollup 与 smaps"""
+import heapq
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import psutil
+from config import HISTORY_LENGTH, SMAPS_CACHE_TTL, SMAPS_MAPPINGS_TTL, SMAPS_CACHE_PIDS, SMAPS_TOP_MAPPINGS
+
+PROC_ROOT = '/proc'
+
+
+@dataclass
+class MemoryBreakdown:
+    pid: int
+    rss_mb: float
+    pss_mb: float
+    anon_mb: float
+    file_mb: float
+    shmem_mb: float
+    swap_mb: float
+    mappings: List[Tuple[float, str]] = field(default_factory=list)  # (MB, 路径)，按占用降序
+    complete: bool = False  # 是否已解析完 smaps 映射列表
+    error: Optional[str] = None  # 无法读取时的原因(进程已退出等)
+
+
+def read_smaps_rollup(pid: int, proc_root: str = PROC_ROOT) -> Optional[Dict[str, int]]:
+    """读取 smaps_rollup 汇总字段(kB)，不可用时返回 None"""
+    try:
+        with open(f"{proc_root}/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':'):
+                    fields[parts[0][:-1]] = int(parts[1])
+            return fields
+    except (OSError, ValueError):
+        return None
+
+
+def top_smaps_mappings(pid: int, limit: int = SMAPS_TOP_MAPPINGS,
+                       proc_root: str = PROC_ROOT) -> List[Tuple[float, str]]:
+    """逐行流式扫描 smaps，按路径合并 Rss 后返回占用最大的映射"""
+    by_path: Dict[str, int] = defaultdict(int)
+    path = '[anon]'
+    try:
+        with open(f"{proc_root}/{pid}/smaps") as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    by_path[path] += int(line.split()[1])
+                elif not line[0].isupper():
+                    # 映射头：地址范围 权限 偏移 设备 inode [路径]
+                    parts = line.split(None, 5)
+                    path = parts[5].strip() if len(parts) > 5 else '[anon]'
+    except (OSError, ValueError, IndexError):
+        return []
+    top = heapq.nlargest(limit, by_path.items(), key=lambda kv: kv[1])
+    return [(kb / 1024, p) for p, kb in top]
+
+
+def breakdown_from_rollup(pid: int, fields: Dict[str, int]) -> MemoryBreakdown:
+    rss = fields.get('Rss', 0)
+    anon = fields.get('Pss_Anon', fields.get('Anonymous', 0))
+    shmem = fields.get('Pss_Shmem', 0)
+    file_backed = fields['Pss_File'] if 'Pss_File' in fields else max(0, rss - anon - shmem)
+    return MemoryBreakdown(
+        pid=pid,
+        rss_mb=rss / 1024,
+        pss_mb=fields.get('Pss', 0) / 1024,
+        anon_mb=anon / 1024,
+        file_mb=file_backed / 1024,
+        shmem_mb=shmem / 1024,
+        swap_mb=fields.get('Swap', 0) / 1024,
+    )
+
+
+def breakdown_from_psutil(pid: int) -> Optional[MemoryBreakdown]:
+    """无 /proc 时(如 macOS)退化为 psutil 可提供的字段"""
+    try:
+        info = psutil.Process(pid).memory_full_info()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+    mb = 1024 * 1024
+    shared = getattr(info, 'shared', 0)
+    return MemoryBreakdown(
+        pid=pid,
+        rss_mb=info.rss / mb,
+        pss_mb=getattr(info, 'pss', info.uss) / mb,
+        anon_mb=info.uss / mb,
+        file_mb=max(0, info.rss - info.uss) / mb,
+        shmem_mb=shared / mb,
+        swap_mb=getattr(info, 'swap', 0) / mb,
+        complete=True,
+    )
+
+
+class MemoryDrilldown:
+    """在后台线程中获取进程内存明细，带短期缓存和历史
+
+    smaps_rollup 开销很小，每次请求过期即刷新；完整 smaps 可能有数万行，
+    只在点击时(full=True)或超过 mappings_ttl 后才重新解析，其间沿用上次的映射列表。
+    """
+
+    def __init__(self, ttl: float = SMAPS_CACHE_TTL, mappings_ttl: float = SMAPS_MAPPINGS_TTL,
+                 proc_root: str = PROC_ROOT):
+        self.ttl = ttl
+        self.mappings_ttl = mappings_ttl
+        self.proc_root = proc_root
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='smaps')
+        self.cache: Dict[int, Tuple[float, MemoryBreakdown]] = {}
+        self.mappings: Dict[int, Tuple[float, List[Tuple[float, str]]]] = {}
+        self.history: Dict[int, deque] = defaultdict(lambda: deque(maxlen=HISTORY_LENGTH))
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def request(self, pid: int, callback: Callable[[MemoryBreakdown], None],
+                full: bool = False) -> Optional[MemoryBreakdown]:
+        """返回未过期的缓存结果；过期时提交后台任务，结果通过 callback 在工作线程中回调
+
+        full 为 True 时(点击进程)映射列表按 ttl 判断是否过期，否则按 mappings_ttl。
+        """
+        now = time.monotonic()
+        with self.lock:
+            cached = self.cache.get(pid)
+            mapped = self.mappings.get(pid)
+            mappings_ttl = self.ttl if full else self.mappings_ttl
+            parse = mapped is None or now - mapped[0] >= mappings_ttl
+            if cached and now - cached[0] < self.ttl and not parse:
+                return cached[1]
+            if pid not in self.pending:
+                self.pending.add(pid)
+                self.executor.submit(self._collect, pid, callback, parse)
+        return cached[1] if cached else None
+
+    def _collect(self, pid: int, callback: Callable[[MemoryBreakdown], None], parse: bool):
+        try:
+            fields = read_smaps_rollup(pid, self.proc_root)
+            if fields is None:
+                result = breakdown_from_psutil(pid)
+                if result is None:
+                    self._fail(pid, callback)
+                else:
+                    self._store(result, callback)
+                return
+            result = breakdown_from_rollup(pid, fields)
+            with self.lock:
+                mapped = self.mappings.get(pid)
+            if not parse and mapped is not None:
+                result.mappings = mapped[1]
+                result.complete = True
+                self._store(result, callback)
+                return
+            # 先回调汇总结果，再解析可能很大的 smaps 补充映射列表
+            if mapped is not None:
+                result.mappings = mapped[1]
+            callback(result)
+            mappings = top_smaps_mappings(pid, proc_root=self.proc_root)
+            with self.lock:
+                self.mappings[pid] = (time.monotonic(), mappings)
+            result.mappings = mappings
+            result.complete = True
+            self._store(result, callback)
+        finally:
+            with self.lock:
+                self.pending.discard(pid)
+
+    def _fail(self, pid: int, callback: Callable[[MemoryBreakdown], None]):
+        """进程已退出或无权读取时清除其缓存，并回调带原因的空结果"""
+        exited = not psutil.pid_exists(pid)
+        with self.lock:
+            self.cache.pop(pid, None)
+            self.mappings.pop(pid, None)
+            if exited:
+                self.history.pop(pid, None)
+        callback(MemoryBreakdown(pid, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, complete=True,
+                                 error="进程已退出" if exited else "无权读取内存明细"))
+
+    def _store(self, result: MemoryBreakdown, callback: Callable[[MemoryBreakdown], None]):
+        with self.lock:
+            self.cache[result.pid] = (time.monotonic(), result)
+            self.history[result.pid].append(result)
+            self._prune()
+        callback(result)
+
+    def _prune(self):
+        """只保留最近读取过的 SMAPS_CACHE_PIDS 个进程，调用方需持有锁"""
+        if len(self.cache) <= SMAPS_CACHE_PIDS:
+            return
+        by_age = sorted(self.cache, key=lambda pid: self.cache[pid][0])
+        for pid in by_age[:len(by_age) - SMAPS_CACHE_PIDS]:
+            del self.cache[pid]
+            self.mappings.pop(pid, None)
+            self.history.pop(pid, None)
+
+    def get_history(self, pid: int) -> List[MemoryBreakdown]:
+        with self.lock:
+            return list(self.history.get(pid, []))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""基于 QPainter 的轻量走势图：列表行内迷你图和多序列叠加图"""
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from PySide6.QtWidgets import QStyledItemDelegate, QStyle, QWidget
+from PySide6.QtCore import Qt, QRectF, QPointF
+from PySide6.QtGui import QPainter, QPainterPath, QPen, QColor, QTransform, QFont
+from config import HISTORY_LENGTH
+
+PALETTE = ['#2980b9', '#e67e22', '#27ae60', '#8e44ad', '#c0392b', '#16a085', '#d35400', '#7f8c8d']
+
+
+class PathCache:
+    """按序列缓存数据坐标下的路径，只有序列末尾出现新样本时才重建
+
+    source(key) 返回历史序列(deque/list)，value 从单个样本取出数值。
+    路径的 x 为样本在 HISTORY_LENGTH 窗口中的位置(最新样本在最右)，y 为原始数值，
+    绘制时再用变换映射到目标矩形，窗口大小变化不需要重建。
+    """
+
+    def __init__(self, source: Callable[[Hashable], Optional[Sequence]], value: Callable = float):
+        self.source = source
+        self.value = value
+        self.entries: Dict[Hashable, Tuple[object, int, QPainterPath, float, float]] = {}
+
+    def get(self, key: Hashable) -> Optional[Tuple[QPainterPath, float, float]]:
+        """返回 (路径, 最小值, 最大值)，无数据时返回 None"""
+        history = self.source(key)
+        if not history:
+            self.entries.pop(key, None)
+            return None
+        last, n = history[-1], len(history)
+        entry = self.entries.get(key)
+        # 持有最后一个样本的引用，用对象身份判断是否有新样本
+        if entry is not None and entry[0] is last and entry[1] == n:
+            return entry[2], entry[3], entry[4]
+        values = [self.value(h) for h in history]
+        offset = HISTORY_LENGTH - n
+        path = QPainterPath(QPointF(offset, values[0]))
+        for i in range(1, n):
+            path.lineTo(offset + i, values[i])
+        lo, hi = min(values), max(values)
+        self.entries[key] = (last, n, path, lo, hi)
+        return path, lo, hi
+
+    def prune(self, keys):
+        """丢弃不再显示的序列"""
+        keep = set(keys)
+        for key in [k for k in self.entries if k not in keep]:
+            del self.entries[key]
+
+
+def _transform(rect: QRectF, lo: float, hi: float) -> QTransform:
+    span = max(hi - lo, 1e-6)
+    sx = rect.width() / max(HISTORY_LENGTH - 1, 1)
+    sy = rect.height() / span
+    # y 轴向下，数值越大越靠上
+    return QTransform(sx, 0, 0, -sy, rect.left(), rect.bottom() + lo * sy)
+
+
+class SparklineDelegate(QStyledItemDelegate):
+    """在列表行右侧绘制该行对象的迷你走势图"""
+
+    def __init__(self, cache: PathCache, width: int = 70, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.width = width
+
+    def paint(self, painter: QPainter, option, index):
+        super().paint(painter, option, index)
+        entry = self.cache.get(index.data(Qt.UserRole))
+        if entry is None:
+            return
+        path, lo, hi = entry
+        # 变化太小时保留最小幅度，避免平线被放大成噪声
+        mid = (lo + hi) / 2
+        lo, hi = min(lo, mid - 0.5), max(hi, mid + 0.5)
+        r = option.rect
+        rect = QRectF(r.right() - self.width - 4, r.top() + 3, self.width, r.height() - 6)
+        selected = option.state & QStyle.State_Selected
+        pen = QPen(QColor('#ffffff' if selected else '#2980b9'), 1.2)
+        pen.setCosmetic(True)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(pen)
+        painter.setTransform(_transform(rect, lo, hi), True)
+        painter.drawPath(path)
+        painter.restore()
+
+
+class OverlayChart(QWidget):
+    """多序列叠加走势图，共用纵轴"""
+
+    def __init__(self, cache: PathCache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.series: List[Tuple[str, Hashable]] = []
+        self.threshold: Optional[float] = None
+
+    def set_series(self, series: List[Tuple[str, Hashable]], threshold: float = None):
+        self.series = series
+        self.threshold = threshold
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor('#ffffff'))
+        entries = [(label, self.cache.get(key)) for label, key in self.series]
+        entries = [(label, e) for label, e in entries if e is not None]
+        plot = QRectF(self.rect()).adjusted(30, 16, -6, -6)
+        painter.setPen(QColor('#dddddd'))
+        painter.drawRect(plot)
+        if not entries:
+            return
+        hi = max(e[2] for _, e in entries) * 1.1 or 1.0
+        transform = _transform(plot, 0.0, hi)
+
+        small = QFont(self.font())
+        small.setPointSize(8)
+        painter.setFont(small)
+        painter.setPen(QColor('#666666'))
+        painter.drawText(QRectF(0, plot.top() - 6, 27, 12), Qt.AlignRight | Qt.AlignVCenter, f"{hi:.1f}")
+        painter.drawText(QRectF(0, plot.bottom() - 6, 27, 12), Qt.AlignRight | Qt.AlignVCenter, "0")
+
+        for i, (label, (path, _, _)) in enumerate(entries):
+            color = QColor(PALETTE[i % len(PALETTE)])
+            pen = QPen(color, 1.5)
+            pen.setCosmetic(True)
+            painter.save()
+            painter.setTransform(transform, True)
+            painter.setPen(pen)
+            painter.drawPath(path)
+            painter.restore()
+            # 图例
+            x = plot.left() + i * (plot.width() / len(entries))
+            painter.fillRect(QRectF(x, 3, 8, 8), color)
+            painter.setPen(QColor('#333333'))
+            painter.drawText(QRectF(x + 11, 0, plot.width() / len(entries) - 12, 14),
+                             Qt.AlignLeft | Qt.AlignVCenter, label)
+
+        if self.threshold is not None and self.threshold <= hi:
+            y = transform.map(QPointF(0, self.threshold)).y()
+            pen = QPen(QColor('#e74c3c'), 1, Qt.DashLine)
+            painter.setPen(pen)
+            painter.drawLine(QPointF(plot.left(), y), QPointF(plot.right(), y))